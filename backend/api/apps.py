@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        if settings.REQUEST_METRICS_ENABLED:
+            from api.metrics import instrument_serializers
+
+            instrument_serializers()
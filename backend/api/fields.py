@@ -0,0 +1,82 @@
+import base64
+import binascii
+import tempfile
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+
+BASE64_HEADER = ';base64,'
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    """Изображение в base64, декодируемое по частям во временный файл.
+
+    Размер проверяется до декодирования, формат и размеры — по
+    заголовку через Pillow. Файл сохраняется под sha256 содержимого,
+    так что одинаковые загрузки используют один и тот же файл.
+    """
+    chunk_size = 64 * 1024
+    formats = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+    default_error_messages = {
+        'invalid_base64': 'Некорректные данные изображения в base64.',
+        'too_large': 'Размер изображения не должен превышать {max_size} '
+                     'байт.',
+        'invalid_format': 'Допустимые форматы изображения: {formats}.',
+        'too_many_pixels': 'Слишком большое изображение: {width}x{height}.',
+    }
+
+    def get_upload_to(self):
+        model = self.parent.Meta.model
+        return model._meta.get_field(self.source).upload_to
+
+    def decode(self, data, start, target):
+        """Пишет декодированные данные в target, возвращает sha256."""
+        digest = sha256()
+        for offset in range(start, len(data), self.chunk_size):
+            try:
+                chunk = base64.b64decode(
+                    data[offset:offset + self.chunk_size], validate=True
+                )
+            except (binascii.Error, ValueError):
+                self.fail('invalid_base64')
+            digest.update(chunk)
+            target.write(chunk)
+        return digest.hexdigest()
+
+    def validate_image(self, file):
+        try:
+            with Image.open(file) as image:
+                image_format = image.format
+                width, height = image.size
+                if width * height > settings.MAX_IMAGE_PIXELS:
+                    self.fail('too_many_pixels', width=width, height=height)
+                image.verify()
+        except (UnidentifiedImageError, Image.DecompressionBombError,
+                OSError, SyntaxError):
+            image_format = None
+        if image_format not in self.formats:
+            self.fail('invalid_format', formats=', '.join(self.formats))
+        return self.formats[image_format]
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid_base64')
+        start = data.find(BASE64_HEADER)
+        start = 0 if start == -1 else start + len(BASE64_HEADER)
+        if (len(data) - start) * 3 // 4 > settings.MAX_IMAGE_UPLOAD_SIZE:
+            self.fail('too_large', max_size=settings.MAX_IMAGE_UPLOAD_SIZE)
+        with tempfile.TemporaryFile() as file:
+            digest = self.decode(data, start, file)
+            if not file.tell():
+                self.fail('invalid_base64')
+            file.seek(0)
+            extension = self.validate_image(file)
+            name = f'{self.get_upload_to()}/{digest}.{extension}'
+            if not default_storage.exists(name):
+                file.seek(0)
+                name = default_storage.save(name, File(file))
+        return name
@@ -1,21 +1,43 @@
 import django_filters
+from django import forms
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.constants import POPULAR_ORDERING
+from recipes.indexes import filter_by_ingredients, tag_registry
+from recipes.models import Ingredient, Recipe
+from recipes.search import search_recipes
+
+
+class IntegerFilter(django_filters.NumberFilter):
+    field_class = forms.IntegerField
+
+
+class IntegerInFilter(django_filters.BaseInFilter, IntegerFilter):
+    """Список целых id через запятую: дробные значения дают 400."""
+
+
+def tag_slug_choices():
+    return tag_registry.slug_choices()
 
 
 class RecipeFilter(django_filters.FilterSet):
     """Кастомные фильтры для Рецепта."""
-    tags = django_filters.ModelMultipleChoiceFilter(
+    tags = django_filters.MultipleChoiceFilter(
         field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+        choices=tag_slug_choices
     )
 
     is_favorited = django_filters.NumberFilter(method='filter_is_favorited')
     is_in_shopping_cart = django_filters.NumberFilter(
         method='filter_is_in_shopping_cart'
     )
+    ingredients = IntegerInFilter(method='filter_ingredients')
+    exclude_ingredients = IntegerInFilter(method='filter_ingredients')
+    search = django_filters.CharFilter(method='filter_search')
+    ordering = django_filters.ChoiceFilter(
+        choices=(('popular', 'По популярности'),),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
@@ -31,6 +53,26 @@ class RecipeFilter(django_filters.FilterSet):
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
 
+    def filter_ingredients(self, queryset, name, value):
+        include = self.form.cleaned_data.get('ingredients') or ()
+        exclude = self.form.cleaned_data.get('exclude_ingredients') or ()
+        if name == 'exclude_ingredients' and include:
+            return queryset
+        return filter_by_ingredients(
+            queryset,
+            include=include, exclude=exclude
+        )
+
+    def filter_search(self, queryset, name, value):
+        if value.strip():
+            return search_recipes(queryset, value.strip())
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.order_by(*POPULAR_ORDERING)
+        return queryset
+
 
 class IngredientSearch(SearchFilter):
     """Кастомные фильтры для Ингредиента."""
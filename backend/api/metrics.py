@@ -0,0 +1,156 @@
+import os
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from rest_framework.serializers import BaseSerializer
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Метрика -> (описание, границы корзин, поле RequestMetrics).
+HISTOGRAMS = {
+    'foodgram_request_duration_seconds': (
+        'Total request time', DURATION_BUCKETS, 'total_time'
+    ),
+    'foodgram_request_db_seconds': (
+        'Time spent in database queries', DURATION_BUCKETS, 'db_time'
+    ),
+    'foodgram_request_serializer_seconds': (
+        'Time spent in serializer .data', DURATION_BUCKETS,
+        'serializer_time'
+    ),
+    'foodgram_request_queries': (
+        'Database queries per request', QUERY_BUCKETS, 'queries'
+    ),
+}
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счетчики одного запроса. Экземпляр передается в
+    connection.execute_wrapper() и считает запросы и время в базе."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.route = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.total_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.queries += 1
+
+    def finish(self):
+        self.total_time = perf_counter() - self.started
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serializer;dur={self.serializer_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Гистограммы по маршрутам (вьюсет и действие) в памяти процесса.
+    Каждый процесс отдает свои значения с меткой worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def observe(self, metrics):
+        with self.lock:
+            for name, (_, buckets, field) in HISTOGRAMS.items():
+                key = (name, metrics.route)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(buckets)
+                self.histograms[key].observe(getattr(metrics, field))
+
+    def render(self):
+        """Гистограммы в текстовом формате Prometheus."""
+        worker = os.getpid()
+        lines = []
+        with self.lock:
+            items = sorted(self.histograms.items())
+            for name, (description, _, _) in HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, route), histogram in items:
+                    if metric != name:
+                        continue
+                    labels = f'route="{route}",worker="{worker}"'
+                    cumulative = 0
+                    for bound, count in zip(
+                        histogram.buckets + ('+Inf',), histogram.counts
+                    ):
+                        cumulative += count
+                        lines.append(
+                            f'{name}_bucket{{{labels},le="{bound}"}} '
+                            f'{cumulative}'
+                        )
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(
+                        f'{name}_count{{{labels}}} {histogram.count}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def route_name(view_func, method):
+    """Имя маршрута: класс вьюсета и действие, например
+    RecipeViewSet.favorite."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown')
+    action = (getattr(view_func, 'actions', None) or {}).get(method.lower())
+    return f'{view_class.__name__}.{action or method.lower()}'
+
+
+def instrument_serializers():
+    """Добавляет в BaseSerializer.data замер времени для текущего
+    запроса. Вложенные вызовы .data не учитываются повторно.
+    Вызывается только при включенных метриках."""
+    data = BaseSerializer.data
+
+    def timed_data(self):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return data.fget(self)
+        metrics.serializer_depth += 1
+        start = perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            metrics.serializer_depth -= 1
+            if not metrics.serializer_depth:
+                metrics.serializer_time += perf_counter() - start
+
+    BaseSerializer.data = property(timed_data)
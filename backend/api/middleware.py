@@ -0,0 +1,123 @@
+import os
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse
+
+from api.metrics import RequestMetrics, current_metrics, registry, route_name
+from api.profiling import (is_staff, profile_call, requested_format,
+                           save_profile)
+from api.slow_queries import SlowQueryLog
+
+
+class RequestMetricsMiddleware:
+    """Считает для каждого запроса число запросов к базе, время в базе,
+    в сериализаторах и общее время. Отдает их в заголовке
+    Server-Timing и копит гистограммы по маршрутам.
+
+    При REQUEST_METRICS_ENABLED = False не подключается совсем.
+    Для потоковых ответов учитывается время до начала отдачи тела.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        metrics.finish()
+        metrics.route = metrics.route or 'unresolved'
+        registry.observe(metrics)
+        response['Server-Timing'] = metrics.server_timing()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.route = route_name(view_func, request.method)
+
+
+class SlowQueryLogMiddleware:
+    """Пишет в лог запросы к базе дольше SLOW_QUERY_LOG_THRESHOLD_MS
+    с маршрутом, отпечатком, числом его повторов в запросе и планом.
+    При нулевом пороге не подключается."""
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG_THRESHOLD_MS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.slow_query_log = SlowQueryLog()
+        with connection.execute_wrapper(request.slow_query_log):
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.slow_query_log.route = route_name(view_func, request.method)
+
+
+class RequestProfilerMiddleware:
+    """Профилирует отдельный запрос администратора по заголовку
+    X-Profile или параметру profile: pstats (cProfile) или collapsed
+    (семплирование стеков для флеймграфа).
+
+    Если задан REQUEST_PROFILER_DIR, профиль сохраняется туда, а имя
+    файла возвращается в заголовке X-Profile-File; иначе вместо ответа
+    отдается сам профиль.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile_format = requested_format(request)
+        if profile_format is None or not is_staff(request):
+            return self.get_response(request)
+        request.profile_route = 'unresolved'
+        response, profile = profile_call(
+            profile_format, lambda: self.respond(request)
+        )
+        extension = 'prof' if profile_format == 'pstats' else 'txt'
+        if not settings.REQUEST_PROFILER_DIR:
+            response = HttpResponse(
+                profile,
+                content_type=(
+                    'application/octet-stream' if profile_format == 'pstats'
+                    else 'text/plain; charset=utf-8'
+                )
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="{request.profile_route}.{extension}"'
+            )
+            return response
+        path = save_profile(profile, profile_format, request.profile_route)
+        response['X-Profile-File'] = os.path.basename(path)
+        return response
+
+    def respond(self, request):
+        """Ответ представления. Потоковый ответ вычитывается целиком,
+        чтобы работа генератора тоже попала в профиль."""
+        response = self.get_response(request)
+        if not response.streaming:
+            return response
+        buffered = HttpResponse(
+            b''.join(response.streaming_content),
+            status=response.status_code
+        )
+        for header, value in response.items():
+            buffered[header] = value
+        return buffered
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, 'profile_route'):
+            request.profile_route = route_name(view_func, request.method)
@@ -1,6 +1,170 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+
+from recipes.constants import POPULAR_ORDERING
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, кэширующий COUNT(*) выборки на
+    PAGINATION_COUNT_CACHE_TIMEOUT секунд."""
+
+    @cached_property
+    def count(self):
+        timeout = settings.PAGINATION_COUNT_CACHE_TIMEOUT
+        if not timeout or not hasattr(self.object_list, 'query'):
+            return super().count
+        sql, params = self.object_list.query.sql_with_params()
+        key = 'pagination_count:' + md5(
+            f'{sql}{params}'.encode()
+        ).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, timeout)
+        return count
+
+
+class KeysetCursorPagination(CursorPagination):
+    """Курсорная пагинация по всем полям ordering, а не только по
+    первому, как в CursorPagination. Курсор хранит значения всех полей
+    последней (или первой) записи страницы, следующая страница
+    выбирается условием (a, b, id) < (a0, b0, id0) без OFFSET, поэтому
+    одинаковые значения первых полей не ломают обход. Последнее поле
+    ordering должно быть уникальным."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.decode_position()
+        if reverse:
+            queryset = queryset.order_by(*(
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in self.ordering
+            ))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position, reverse))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = position is not None
+        self.previous_position = self.next_position = None
+        if self.page:
+            self.previous_position = self.position(self.page[0])
+            self.next_position = self.position(self.page[-1])
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def decode_position(self):
+        if self.cursor is None or self.cursor.position is None:
+            return None
+        try:
+            position = json.loads(self.cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(position, list)
+                or len(position) != len(self.ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def position(self, instance):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            values.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value
+            )
+        return json.dumps(values)
+
+    def keyset_filter(self, position, reverse):
+        """Записи строго после position в порядке ordering (или строго
+        до нее при reverse): OR по i от (поля до i равны, i-е больше)."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_next_link(self):
+        if not self.has_next or self.next_position is None:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self.next_position
+        ))
+
+    def get_previous_link(self):
+        if not self.has_previous or self.previous_position is None:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True, position=self.previous_position
+        ))
+
+
+class RecipeCursorPagination(KeysetCursorPagination):
+    """Курсорная пагинация ленты рецептов по (pub_date, id)."""
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        return super().get_ordering(request, queryset, view)
+
+
+class UserCursorPagination(KeysetCursorPagination):
+    """Курсорная пагинация пользователей и подписок."""
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('username',)
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация. При наличии параметра cursor в запросе
+    (в том числе пустого) переключается на cursor_pagination_class
+    вьюсета, работающую без OFFSET и COUNT(*)."""
     page_size = 6
     page_size_query_param = 'limit'
+    django_paginator_class = CachedCountPaginator
+    cursor_query_param = 'cursor'
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_class = getattr(view, 'cursor_pagination_class', None)
+        if (cursor_class is not None
+                and self.cursor_query_param in request.query_params):
+            self.cursor_paginator = cursor_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
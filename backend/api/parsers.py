@@ -0,0 +1,36 @@
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большое тело запроса.'
+    default_code = 'request_too_large'
+
+
+class LimitedJSONParser(JSONParser):
+    """JSONParser с ограничением размера тела MAX_JSON_BODY_SIZE.
+
+    DRF читает JSON прямо из потока запроса, и
+    DATA_UPLOAD_MAX_MEMORY_SIZE к нему не применяется. Запрос
+    с Content-Length больше лимита отклоняется без чтения тела, без
+    заголовка читается не больше лимита.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        limit = settings.MAX_JSON_BODY_SIZE
+        request = (parser_context or {}).get('request')
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (AttributeError, ValueError):
+            length = 0
+        if length > limit:
+            raise RequestTooLarge()
+        body = stream.read(limit + 1) if stream is not None else b''
+        if len(body) > limit:
+            raise RequestTooLarge()
+        return super().parse(BytesIO(body), media_type, parser_context)
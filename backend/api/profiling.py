@@ -0,0 +1,106 @@
+import cProfile
+import marshal
+import os
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+PROFILE_FORMATS = ('pstats', 'collapsed')
+
+
+def requested_format(request):
+    """Формат профиля из заголовка X-Profile или параметра profile."""
+    value = request.headers.get('X-Profile') or request.GET.get('profile')
+    if value in PROFILE_FORMATS:
+        return value
+    if value:
+        return 'pstats'
+    return None
+
+
+def is_staff(request):
+    """Проверяет пользователя теми же способами аутентификации, что
+    и API: токен проверяется до вызова представления."""
+    drf_request = Request(request, authenticators=[
+        authentication() for authentication in
+        api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+    try:
+        return drf_request.user.is_staff
+    except APIException:
+        return False
+
+
+class StackSampler(threading.Thread):
+    """Семплирующий профилировщик: раз в interval секунд снимает стек
+    потока запроса и считает одинаковые стеки в формате collapsed
+    (flamegraph.pl, speedscope)."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f'{code.co_name} ({os.path.basename(code.co_filename)}'
+                    f':{code.co_firstlineno})'
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stopped.set()
+        self.join()
+
+    def output(self):
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items()
+        ).encode()
+
+
+def profile_call(profile_format, function):
+    """Выполняет function() под профилировщиком и возвращает
+    (результат, профиль в байтах)."""
+    if profile_format == 'collapsed':
+        with StackSampler(
+            threading.get_ident(), settings.REQUEST_PROFILER_INTERVAL
+        ) as sampler:
+            result = function()
+        return result, sampler.output()
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function)
+    profiler.create_stats()
+    return result, marshal.dumps(profiler.stats)
+
+
+def save_profile(data, profile_format, route):
+    """Сохраняет профиль в REQUEST_PROFILER_DIR и возвращает путь."""
+    extension = 'prof' if profile_format == 'pstats' else 'txt'
+    name = (
+        f'{datetime.now():%Y%m%d-%H%M%S-%f}-{route}-{os.getpid()}'
+        f'.{extension}'
+    )
+    path = os.path.join(settings.REQUEST_PROFILER_DIR, name)
+    os.makedirs(settings.REQUEST_PROFILER_DIR, exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(data)
+    return path
@@ -1,19 +1,26 @@
 import webcolors
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from rest_framework import serializers
 
+from api.fields import StreamingBase64ImageField
 from recipes.constants import (
     MAX_QUANTITY,
-    MIN_QUANTITY
+    MIN_QUANTITY,
+    RELATIONS_BATCH_LIMIT
 )
+from recipes.caches import recipe_cache
+from recipes.changes import record_changes
+from recipes.duplicates import schedule_duplicate_lookup
+from recipes.images import image_srcset
+from recipes.indexes import tag_registry
 from recipes.models import (
-    FavoriteRecipes,
     Ingredient,
     IngredientInRecipe,
     Recipe,
-    ShoppingCart,
     Tag
 )
+from users.models import Subscription
 from users.serializers import CustomUserSerializer
 
 
@@ -46,11 +53,59 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'color', 'slug')
 
 
+class TagRelatedField(serializers.PrimaryKeyRelatedField):
+    """Поле тэга по id, проверяемое по справочнику тэгов в памяти."""
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            tag = tag_registry.get_by_id(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return tag
+
+
+class TagListField(serializers.Field):
+    """Тэги рецепта в готовом представлении из справочника."""
+    def to_representation(self, value):
+        return [
+            tag_registry.representation(tag.id) or TagSerializer(tag).data
+            for tag in value.all()
+        ]
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор Рецепта для вывода частичной информации о нем."""
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
+
+    def get_image_srcset(self, obj):
+        return image_srcset(obj, self.context.get('request'))
+
+
+class PantryRecipeSerializer(RecipeSerializer):
+    """Сериализатор рецепта, подобранного по имеющимся продуктам."""
+    coverage = serializers.FloatField(read_only=True)
+    matched_count = serializers.IntegerField(read_only=True)
+    missing_ingredients = IngredientSerializer(many=True, read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + (
+            'coverage', 'matched_count', 'missing_ingredients'
+        )
+
+
+class SimilarRecipeSerializer(RecipeSerializer):
+    """Сериализатор похожего рецепта со значением сходства."""
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('score',)
 
 
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
@@ -78,25 +133,102 @@ class IngridientAddRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+def recipe_prefetches():
+    return (
+        Prefetch('tags', queryset=Tag.objects.only('id')),
+        Prefetch(
+            'recipe',
+            queryset=IngredientInRecipe.objects.select_related('ingredient')
+        ),
+    )
+
+
+class CachedRecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов: тэги и ингредиенты догружаются одним запросом
+    на страницу и только для рецептов, которых нет в кэше."""
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        base_url = self.child.get_base_url()
+        cached = {
+            recipe.pk: recipe_cache.get_representation(recipe, base_url)
+            for recipe in recipes
+        }
+        misses = [recipe for recipe in recipes if cached[recipe.pk] is None]
+        if misses:
+            prefetch_related_objects(misses, *recipe_prefetches())
+        return [
+            self.child.represent(recipe, cached[recipe.pk], base_url)
+            for recipe in recipes
+        ]
+
+
 class RecipeListSerializer(serializers.ModelSerializer):
-    """Сериализатор для получения Рецептов/Рецепта."""
-    tags = TagSerializer(read_only=True, many=True)
+    """Сериализатор для получения Рецептов/Рецепта.
+    Представление без пользовательских флагов берется из кэша,
+    флаги текущего пользователя подставляются поверх."""
+    tags = TagListField(read_only=True)
     author = CustomUserSerializer(read_only=True)
     ingredients = IngredientInRecipeSerializer(many=True, source='recipe')
-    image = Base64ImageField()
+    image = StreamingBase64ImageField(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author',
             'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image',
+            'is_in_shopping_cart', 'name', 'image', 'image_srcset',
             'text', 'cooking_time'
         )
+        list_serializer_class = CachedRecipeListSerializer
+
+    def get_base_url(self):
+        request = self.context.get('request')
+        return request.build_absolute_uri('/') if request else ''
+
+    def get_author_is_subscribed(self, obj):
+        if hasattr(obj, 'author_subscribed'):
+            return obj.author_subscribed
+        request = self.context.get('request')
+        if request is None or request.user.is_anonymous:
+            return False
+        return Subscription.objects.filter(
+            user=request.user, author=obj.author_id
+        ).exists()
+
+    def to_representation(self, instance):
+        base_url = self.get_base_url()
+        return self.represent(
+            instance,
+            recipe_cache.get_representation(instance, base_url),
+            base_url
+        )
+
+    def represent(self, instance, data, base_url):
+        if data is None:
+            prefetch_related_objects([instance], *recipe_prefetches())
+            # Подписка на автора зависит от пользователя и подставляется
+            # ниже, в кэш попадает значение по умолчанию.
+            instance.author.subscribed = False
+            data = super().to_representation(instance)
+            recipe_cache.set_representation(instance, base_url, data)
+        data = dict(data)
+        data['author'] = dict(
+            data['author'],
+            is_subscribed=self.get_author_is_subscribed(instance)
+        )
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        return data
+
+    def get_image_srcset(self, obj):
+        return image_srcset(obj, self.context.get('request'))
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context['request']
         if request.user.is_authenticated:
             return obj.fav_recipes.filter(
@@ -105,6 +237,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context['request']
         if request.user.is_authenticated:
             return obj.shopping_cart.filter(
@@ -115,8 +249,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
 
 class RecipeAddSerializer(serializers.ModelSerializer):
     """Сериализатор для получения Рецептов/Рецепта."""
-    image = Base64ImageField(required=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    image = StreamingBase64ImageField(required=True)
+    tags = TagRelatedField(
         queryset=Tag.objects.all(),
         required=True,
         many=True
@@ -158,38 +292,97 @@ class RecipeAddSerializer(serializers.ModelSerializer):
         return attrs
 
     @staticmethod
-    def create_ingredients(recipe, ingredients):
-        ingredients_list = [
+    def ingredients_changed(recipe):
+        """Обновляет кэши и индексы рецепта после фиксации транзакции."""
+        recipe_cache.invalidate_recipes([recipe.pk])
+        record_changes([recipe.pk], ingredients=True)
+
+    def create_ingredients(self, recipe, ingredients):
+        IngredientInRecipe.objects.bulk_create([
             IngredientInRecipe(
                 recipe=recipe,
                 ingredient=ingredient['id'],
                 amount=ingredient['amount']
             ) for ingredient in ingredients
+        ])
+        self.ingredients_changed(recipe)
+
+    def update_ingredients(self, recipe, ingredients):
+        """Сравнивает переданные ингредиенты с сохраненными и пишет
+        только разницу: новые строки, измененные количества
+        и удаленные ингредиенты."""
+        submitted = {
+            ingredient['id'].id: ingredient for ingredient in ingredients
+        }
+        current = {row.ingredient_id: row for row in recipe.recipe.all()}
+        changed = []
+        for ingredient_id, row in current.items():
+            if (ingredient_id in submitted
+                    and row.amount != submitted[ingredient_id]['amount']):
+                row.amount = submitted[ingredient_id]['amount']
+                changed.append(row)
+        removed = [
+            row.pk for ingredient_id, row in current.items()
+            if ingredient_id not in submitted
         ]
-        IngredientInRecipe.objects.bulk_create(ingredients_list)
+        added = [
+            ingredient for ingredient_id, ingredient in submitted.items()
+            if ingredient_id not in current
+        ]
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        if removed:
+            IngredientInRecipe.objects.filter(pk__in=removed).delete()
+        if added:
+            IngredientInRecipe.objects.bulk_create([
+                IngredientInRecipe(
+                    recipe=recipe,
+                    ingredient=ingredient['id'],
+                    amount=ingredient['amount']
+                ) for ingredient in added
+            ])
+        if changed or removed or added:
+            self.ingredients_changed(recipe)
+
+    @staticmethod
+    def update_tags(recipe, tags):
+        current = set(recipe.tags.values_list('id', flat=True))
+        submitted = {tag.id for tag in tags}
+        if current - submitted:
+            recipe.tags.remove(*(current - submitted))
+        if submitted - current:
+            recipe.tags.add(*(submitted - current))
 
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(
-            **validated_data
-        )
-        recipe.tags.set(tags)
-        self.create_ingredients(recipe, ingredients)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.tags.set(tags)
+            self.create_ingredients(recipe, ingredients)
+            schedule_duplicate_lookup(recipe)
         return recipe
 
     def update(self, instance, validated_data):
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        if ingredients:
-            instance.ingredients.clear()
-        instance.tags.set(tags)
-        self.create_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+        changed_fields = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        with transaction.atomic():
+            if changed_fields:
+                for field in changed_fields:
+                    setattr(instance, field, validated_data[field])
+                instance.save(update_fields=changed_fields)
+            self.update_tags(instance, tags)
+            self.update_ingredients(instance, ingredients)
+        return instance
 
     def to_representation(self, instance):
+        # Версия представления увеличена в базе при записи, в кэше
+        # под старой версией лежит прежнее представление рецепта.
+        instance.refresh_from_db(fields=['representation_version'])
         return RecipeListSerializer(
             instance,
             context={
@@ -198,45 +391,11 @@ class RecipeAddSerializer(serializers.ModelSerializer):
         ).data
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Сериализатор Избранного."""
-    class Meta:
-        model = FavoriteRecipes
-        fields = ('user', 'recipe')
-
-    def validate(self, attrs):
-        user = attrs['user']
-        recipe = attrs['recipe']
-        if user.fav_recipes_user.filter(recipe=recipe).exists():
-            raise serializers.ValidationError(
-                f'Рецепт {recipe} уже добавлен в избранное'
-            )
-        return attrs
-
-    def to_representation(self, instance):
-        request = self.context['request']
-        return RecipeSerializer(
-            instance.recipe, context={'request': request}
-        ).data
-
-
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериализатор Продуктовой Корзины."""
-    class Meta:
-        model = ShoppingCart
-        fields = ('user', 'recipe')
-
-    def validate(self, attrs):
-        user = attrs['user']
-        recipe = attrs['recipe']
-        if user.shopping_cart_user.filter(recipe=recipe).exists():
-            raise serializers.ValidationError(
-                f'Рецепт {recipe} уже добавлен в корзину'
-            )
-        return attrs
-
-    def to_representation(self, instance):
-        request = self.context['request']
-        return RecipeSerializer(
-            instance.recipe, context={'request': request}
-        ).data
+class RelationsBatchSerializer(serializers.Serializer):
+    """Список id рецептов или авторов для пакетного добавления
+    в избранное, корзину или подписки и удаления из них."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RELATIONS_BATCH_LIMIT
+    )
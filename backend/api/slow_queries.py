@@ -0,0 +1,140 @@
+import logging
+import re
+import threading
+from collections import Counter
+from hashlib import md5
+from time import perf_counter
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+NORMALIZE_PATTERNS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\?(?:\s*,\s*\?)+'), '?, ...'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def normalize_sql(sql):
+    """SQL без значений: литералы и параметры заменены на ?,
+    списки IN (...) любой длины сведены к одному виду."""
+    for pattern, replacement in NORMALIZE_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    return md5(sql.encode()).hexdigest()[:12]
+
+
+def explain(sql, params):
+    """План запроса: EXPLAIN [ANALYZE] на PostgreSQL,
+    EXPLAIN QUERY PLAN на SQLite. Выполняется в точке сохранения,
+    чтобы ошибка не прерывала транзакцию запроса."""
+    if connection.vendor == 'postgresql':
+        prefix = (
+            'EXPLAIN (ANALYZE, BUFFERS) '
+            if settings.SLOW_QUERY_LOG_ANALYZE else 'EXPLAIN '
+        )
+    elif connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        return None
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    return '\n'.join(' '.join(str(value) for value in row) for row in rows)
+
+
+class SlowQueryStats:
+    """Скользящая таблица самых тяжелых запросов процесса по
+    суммарному времени. Хранит не больше SLOW_QUERY_LOG_TOP
+    отпечатков: при переполнении вдвое отбрасываются самые легкие."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def add(self, key, sql, duration, route, count, plan):
+        with self.lock:
+            entry = self.entries.setdefault(key, {
+                'fingerprint': key,
+                'sql': sql,
+                'calls': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+            })
+            entry['calls'] += 1
+            entry['total_ms'] += duration * 1000
+            entry['max_ms'] = max(entry['max_ms'], duration * 1000)
+            entry['route'] = route
+            entry['count_in_request'] = count
+            entry['plan'] = plan
+            if len(self.entries) > 2 * settings.SLOW_QUERY_LOG_TOP:
+                self.entries = {
+                    entry['fingerprint']: entry for entry in self.top()
+                }
+
+    def top(self):
+        return sorted(
+            self.entries.values(),
+            key=lambda entry: entry['total_ms'],
+            reverse=True
+        )[:settings.SLOW_QUERY_LOG_TOP]
+
+    def snapshot(self):
+        with self.lock:
+            return [dict(entry) for entry in self.top()]
+
+
+slow_query_stats = SlowQueryStats()
+
+
+class SlowQueryLog:
+    """Обертка connection.execute_wrapper() на время одного запроса:
+    считает отпечатки всех запросов, а запросы дольше
+    SLOW_QUERY_LOG_THRESHOLD_MS пишет в лог вместе с планом."""
+
+    def __init__(self):
+        self.route = None
+        self.fingerprints = Counter()
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        start = perf_counter()
+        result = execute(sql, params, many, context)
+        self.record(sql, params, many, perf_counter() - start)
+        return result
+
+    def record(self, sql, params, many, duration):
+        normalized = normalize_sql(sql)
+        key = fingerprint(normalized)
+        self.fingerprints[key] += 1
+        if duration * 1000 < settings.SLOW_QUERY_LOG_THRESHOLD_MS:
+            return
+        plan = None
+        if not many and normalized.upper().startswith(('SELECT', 'WITH')):
+            self.explaining = True
+            try:
+                plan = explain(sql, params)
+            finally:
+                self.explaining = False
+        slow_query_stats.add(
+            key, normalized, duration, self.route,
+            self.fingerprints[key], plan
+        )
+        logger.warning(
+            'Slow query %.1f ms in %s [%s, %d in request]: %s\nPlan:\n%s',
+            duration * 1000, self.route, key, self.fingerprints[key],
+            normalized, plan
+        )
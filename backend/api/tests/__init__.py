@@ -0,0 +1,30 @@
+from django.core.cache import cache
+
+from recipes.caches import recipe_cache
+from recipes.duplicates import duplicate_index
+from recipes.indexes import (ingredient_index, ingredient_trigram_index,
+                             recipe_ingredient_index, tag_registry)
+
+INDEXES = (
+    ingredient_index, ingredient_trigram_index, tag_registry,
+    recipe_ingredient_index, recipe_cache, duplicate_index,
+)
+
+
+def reset_indexes(cold=False):
+    """Сбрасывает кэш и индексы в памяти процесса. Индексы строятся
+    заново, но срок сверки версии у них истек: в бюджет попадает
+    сверка каждого индекса, нужного эндпоинту, как в первом запросе
+    после INDEX_VERSION_CHECK_INTERVAL. При cold=True индексы не
+    строятся, и в бюджет попадает их построение.
+
+    Откат транзакции теста возвращает и номера версий индексов, так
+    что копия из прошлого теста может совпасть по версии с базой:
+    тесты, читающие индексы, сбрасывают их перед каждым тестом."""
+    cache.clear()
+    for index in INDEXES:
+        index._data = None
+        index._checked_at = None
+        if not cold:
+            index.get()
+            index._checked_at = None
@@ -0,0 +1,92 @@
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase
+
+from recipes.caches import recipe_cache
+from recipes.models import FavoriteRecipes, Recipe
+from recipes.relations import add_relation, remove_relation
+from users.models import CustomUser, Subscription
+
+
+class CounterDriftTest(TestCase):
+    """Полное сохранение устаревшего объекта не затирает счетчики,
+    которые изменились после его загрузки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (
+            CustomUser.objects.create(
+                email=f'{name}@example.com', username=name,
+                first_name='Имя', last_name='Фамилия',
+                password=f'password-{name}'
+            ) for name in ('author', 'reader')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Описание',
+            cooking_time=5, image='recipes/images/recipe.jpg'
+        )
+
+    def test_stale_recipe_save_keeps_favorites_count(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertTrue(add_relation(
+            FavoriteRecipes, user=self.reader, recipe=self.recipe
+        ))
+        stale.name = 'Новое название'
+        stale.save()
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_stale_user_save_keeps_counters(self):
+        stale = CustomUser.objects.get(pk=self.author.pk)
+        self.assertTrue(add_relation(
+            Subscription, user=self.reader, author=self.author
+        ))
+        stale.first_name = 'Другое'
+        stale.save()
+        author = CustomUser.objects.get(pk=self.author.pk)
+        self.assertEqual(author.first_name, 'Другое')
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(author.recipes_count, 1)
+
+    def test_counters_follow_relations(self):
+        for _ in range(2):
+            add_relation(FavoriteRecipes, user=self.reader, recipe=self.recipe)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        for _ in range(2):
+            remove_relation(
+                FavoriteRecipes, user=self.reader, recipe=self.recipe
+            )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_stale_recipe_save_bumps_representation_version(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        recipe_cache.invalidate_recipes([self.recipe.pk])
+        stale.name = 'Новое название'
+        stale.save()
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).representation_version,
+            stale.representation_version + 2
+        )
+
+    def test_failed_counter_update_rolls_back_relation(self):
+        with mock.patch(
+            'recipes.signals.change_counter', side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                add_relation(
+                    FavoriteRecipes, user=self.reader, recipe=self.recipe
+                )
+        self.assertFalse(FavoriteRecipes.objects.exists())
+        add_relation(FavoriteRecipes, user=self.reader, recipe=self.recipe)
+        with mock.patch(
+            'recipes.signals.change_counter', side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                remove_relation(
+                    FavoriteRecipes, user=self.reader, recipe=self.recipe
+                )
+        self.assertTrue(FavoriteRecipes.objects.exists())
@@ -0,0 +1,94 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from api.tests import reset_indexes
+from recipes.duplicates import (duplicate_index, mark_duplicate,
+                                schedule_duplicate_lookup)
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+from users.models import CustomUser
+
+
+class DuplicateRecipesTest(TestCase):
+    """Поиск почти одинаковых рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        beet, cabbage, potato, egg = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Свекла', 'Капуста', 'Картофель', 'Яйцо')
+        )
+        cls.borscht, cls.omelette, cls.copy = (
+            Recipe.objects.create(
+                author=author, name=name, text='Описание',
+                cooking_time=5, image='recipes/images/recipe.jpg'
+            ) for name in ('Борщ', 'Омлет', 'Борщ')
+        )
+        for recipe, ingredients in (
+            (cls.borscht, (beet, cabbage, potato)),
+            (cls.omelette, (egg,)),
+            (cls.copy, (beet, cabbage, potato)),
+        ):
+            for ingredient in ingredients:
+                IngredientInRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=10
+                )
+        cls.ingredient_ids = [beet.pk, cabbage.pk, potato.pk]
+
+    def setUp(self):
+        reset_indexes(cold=True)
+
+    def duplicates(self):
+        return dict(Recipe.objects.filter(
+            duplicate_of__isnull=False
+        ).values_list('id', 'duplicate_of'))
+
+    def test_find_duplicates(self):
+        self.assertEqual(
+            duplicate_index.find_duplicates(
+                'Борщ', self.ingredient_ids, exclude=self.copy.pk
+            ),
+            [(self.borscht.pk, 1.0)]
+        )
+        self.assertEqual(
+            duplicate_index.find_duplicates('Запеканка', [], exclude=None),
+            []
+        )
+
+    def test_later_recipe_is_marked(self):
+        mark_duplicate(self.borscht.pk)
+        mark_duplicate(self.omelette.pk)
+        self.assertEqual(self.duplicates(), {})
+        mark_duplicate(self.copy.pk)
+        self.assertEqual(self.duplicates(), {self.copy.pk: self.borscht.pk})
+
+    @override_settings(DUPLICATE_LOOKUP_WORKERS=0)
+    def test_lookup_runs_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            schedule_duplicate_lookup(self.copy)
+        self.assertEqual(self.duplicates(), {})
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.duplicates(), {self.copy.pk: self.borscht.pk})
+
+    def test_command_saves_groups(self):
+        Recipe.objects.filter(pk=self.omelette.pk).update(
+            duplicate_of=self.borscht.pk
+        )
+        for batch_size in (1, 1000):
+            with self.subTest(batch_size=batch_size):
+                output = StringIO()
+                call_command(
+                    'find_duplicate_recipes', save=True,
+                    batch_size=batch_size, stdout=output
+                )
+                self.assertIn('1 duplicates found among 3 recipes, '
+                              '2 distinct recipes', output.getvalue())
+                self.assertEqual(
+                    self.duplicates(), {self.copy.pk: self.borscht.pk}
+                )
@@ -0,0 +1,74 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests import reset_indexes
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+from users.models import CustomUser
+
+
+class IngredientFilterTest(TestCase):
+    """Фильтры ingredients и exclude_ingredients списка рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        cls.flour, cls.egg, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Яйцо', 'Молоко')
+        )
+        cls.pancakes, cls.omelette, cls.bread = (
+            Recipe.objects.create(
+                author=author, name=name, text='Описание',
+                cooking_time=5, image='recipes/images/recipe.jpg'
+            ) for name in ('Блины', 'Омлет', 'Хлеб')
+        )
+        for recipe, ingredients in (
+            (cls.pancakes, (cls.flour, cls.egg, cls.milk)),
+            (cls.omelette, (cls.egg, cls.milk)),
+            (cls.bread, (cls.flour,)),
+        ):
+            for ingredient in ingredients:
+                IngredientInRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=10
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+        reset_indexes(cold=True)
+
+    def recipe_ids(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return {recipe['id'] for recipe in response.json()['results']}
+
+    def test_required_ingredients(self):
+        self.assertEqual(
+            self.recipe_ids(f'ingredients={self.egg.pk},{self.milk.pk}'),
+            {self.pancakes.pk, self.omelette.pk}
+        )
+        self.assertEqual(
+            self.recipe_ids(f'ingredients={self.flour.pk},{self.egg.pk}'),
+            {self.pancakes.pk}
+        )
+
+    def test_excluded_ingredients(self):
+        self.assertEqual(
+            self.recipe_ids(f'exclude_ingredients={self.egg.pk}'),
+            {self.bread.pk}
+        )
+        self.assertEqual(
+            self.recipe_ids(
+                f'ingredients={self.flour.pk}'
+                f'&exclude_ingredients={self.milk.pk}'
+            ),
+            {self.bread.pk}
+        )
+
+    def test_non_integer_ids_are_rejected(self):
+        for query in ('ingredients=1.5', 'exclude_ingredients=1,x'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/recipes/?{query}')
+                self.assertEqual(response.status_code, 400)
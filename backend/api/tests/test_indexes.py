@@ -0,0 +1,117 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from recipes.duplicates import DuplicateIndex
+from recipes.indexes import RecipeIngredientIndex
+from recipes.models import IndexChange, Ingredient, IngredientInRecipe, Recipe
+from users.models import CustomUser
+
+INGREDIENTS = 6
+RECIPES = 4
+
+
+class VersionedIndexTest(TestCase):
+    """Копия индекса другого процесса догоняет изменения по журналу
+    IndexChange, а при неполном журнале перестраивается целиком."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {number}', measurement_unit='г'
+            ) for number in range(INGREDIENTS)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=5, image='recipes/images/recipe.jpg'
+            ) for number in range(RECIPES)
+        ]
+        for number, recipe in enumerate(cls.recipes):
+            for ingredient in cls.ingredients[number:number + 3]:
+                IngredientInRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=10
+                )
+
+    def setUp(self):
+        # Писатель и читатель - копии индекса в двух процессах.
+        self.writer = RecipeIngredientIndex()
+        self.reader = RecipeIngredientIndex()
+        self.writer.get()
+        self.reader.get()
+
+    def change_recipes(self):
+        """Меняет состав первого рецепта и удаляет последний."""
+        first, last = self.recipes[0], self.recipes[-1]
+        recipe_ids = [first.pk, last.pk]
+        IngredientInRecipe.objects.filter(recipe=first).delete()
+        IngredientInRecipe.objects.create(
+            recipe=first, ingredient=self.ingredients[-1], amount=5
+        )
+        Recipe.objects.filter(pk=last.pk).delete()
+        return recipe_ids
+
+    def assertFresh(self, index):
+        index._checked_at = None
+        with mock.patch.object(
+            index, 'build', wraps=index.build
+        ) as build:
+            data = index.get()
+        self.assertEqual(data, RecipeIngredientIndex().build())
+        return build.call_count
+
+    def test_writer_updates_own_copy(self):
+        snapshot = self.writer.get()
+        self.writer.refresh_recipes(self.change_recipes())
+        self.assertEqual(self.assertFresh(self.writer), 0)
+        # Прежняя копия не меняется: ее читатели работают без блокировки.
+        self.assertIn(self.recipes[-1].pk, snapshot['recipes'])
+
+    def test_reader_replays_change_log(self):
+        recipe_ids = self.change_recipes()
+        self.writer.refresh_recipes(recipe_ids[:1])
+        self.writer.refresh_recipes(recipe_ids[1:])
+        self.assertEqual(self.assertFresh(self.reader), 0)
+
+    def test_reader_rebuilds_after_invalidate(self):
+        self.writer.refresh_recipes(self.change_recipes())
+        self.writer.invalidate()
+        self.assertEqual(self.assertFresh(self.reader), 1)
+
+    def test_reader_rebuilds_without_log_entries(self):
+        self.writer.refresh_recipes(self.change_recipes())
+        IndexChange.objects.all().delete()
+        self.assertEqual(self.assertFresh(self.reader), 1)
+
+    @override_settings(INDEX_CHANGE_LOG_SIZE=1)
+    def test_reader_rebuilds_when_too_far_behind(self):
+        recipe_ids = self.change_recipes()
+        self.writer.refresh_recipes(recipe_ids[:1])
+        self.writer.refresh_recipes(recipe_ids[1:])
+        self.assertEqual(self.assertFresh(self.reader), 1)
+
+    def test_duplicate_index_replays_change_log(self):
+        writer, reader = DuplicateIndex(), DuplicateIndex()
+        # build() берет составы рецептов из индекса ингредиентов.
+        with mock.patch(
+            'recipes.duplicates.recipe_ingredient_index',
+            RecipeIngredientIndex()
+        ):
+            writer.get()
+            snapshot = reader.get()
+        writer.refresh_recipes(self.change_recipes())
+        reader._checked_at = None
+        with mock.patch.object(reader, 'build', wraps=reader.build) as build:
+            data = reader.get()
+        self.assertEqual(build.call_count, 0)
+        with mock.patch(
+            'recipes.duplicates.recipe_ingredient_index',
+            RecipeIngredientIndex()
+        ):
+            self.assertEqual(data, DuplicateIndex().build())
+        self.assertIn(self.recipes[-1].pk, snapshot['signatures'])
@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.constants import POPULAR_ORDERING
+from recipes.models import Recipe
+from users.models import CustomUser
+
+PUB_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+RECIPES = 25
+LIMIT = 4
+# Больше offset_cutoff = 1000 у CursorPagination.
+POPULAR_RECIPES = 1100
+POPULAR_LIMIT = 100
+
+
+def create_recipes(count, favorites_count=lambda number: 0):
+    """Рецепты одного автора с одинаковой датой публикации:
+    порядок среди них задают только остальные поля ordering."""
+    author = CustomUser.objects.create(
+        email='author@example.com', username='author',
+        first_name='Имя', last_name='Фамилия', password='password'
+    )
+    Recipe.objects.bulk_create(
+        Recipe(
+            author=author, name=f'Рецепт {number}', text='Описание',
+            cooking_time=5, image='recipes/images/recipe.jpg',
+            favorites_count=favorites_count(number)
+        ) for number in range(count)
+    )
+    Recipe.objects.update(pub_date=PUB_DATE)
+
+
+class CursorWalkMixin:
+    """Обход всех страниц курсорной пагинации вперед и назад."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def walk(self, url):
+        """Идет по ссылкам next, затем обратно по previous.
+        Возвращает id рецептов в порядке обоих обходов. Страницы
+        выбираются по ключу, без OFFSET."""
+        forward, pages = [], []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).json()
+            for query in queries.captured_queries:
+                self.assertNotIn('OFFSET', query['sql'])
+            pages.append(data['results'])
+            forward.extend(recipe['id'] for recipe in data['results'])
+            last_page, url = data, data['next']
+            self.assertLessEqual(len(pages), POPULAR_RECIPES)
+        backward = [recipe['id'] for recipe in pages[-1]]
+        url = last_page['previous']
+        while url:
+            data = self.client.get(url).json()
+            backward[:0] = [recipe['id'] for recipe in data['results']]
+            url = data['previous']
+        return forward, backward
+
+
+class CursorPaginationTest(CursorWalkMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_recipes(RECIPES)
+
+    def test_recipes_with_equal_pub_date(self):
+        forward, backward = self.walk(
+            f'/api/recipes/?cursor=&limit={LIMIT}'
+        )
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+
+class PopularCursorPaginationTest(CursorWalkMixin, TestCase):
+    """ordering=popular: больше offset_cutoff рецептов с одинаковым
+    числом добавлений в избранное."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_recipes(
+            POPULAR_RECIPES, lambda number: 3 if number % 100 == 0 else 0
+        )
+
+    def test_popular_ordering(self):
+        forward, backward = self.walk(
+            f'/api/recipes/?ordering=popular&cursor=&limit={POPULAR_LIMIT}'
+        )
+        expected = list(Recipe.objects.order_by(
+            *POPULAR_ORDERING
+        ).values_list('id', flat=True))
+        self.assertEqual(len(set(forward)), POPULAR_RECIPES)
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
@@ -0,0 +1,95 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests import reset_indexes
+from recipes.indexes import recipe_ingredient_index
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+from users.models import CustomUser
+
+
+class PantryTest(TestCase):
+    """Подбор рецептов по имеющимся ингредиентам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        cls.flour, cls.egg, cls.milk, cls.rice = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Яйцо', 'Молоко', 'Рис')
+        )
+        cls.pancakes, cls.omelette, cls.bread, cls.toast, cls.pilaf = (
+            Recipe.objects.create(
+                author=author, name=name, text='Описание',
+                cooking_time=5, image='recipes/images/recipe.jpg'
+            ) for name in ('Блины', 'Омлет', 'Хлеб', 'Тост', 'Плов')
+        )
+        for recipe, ingredients in (
+            (cls.pancakes, (cls.flour, cls.egg, cls.milk)),
+            (cls.omelette, (cls.egg, cls.milk)),
+            (cls.bread, (cls.flour,)),
+            (cls.toast, (cls.flour,)),
+            (cls.pilaf, (cls.rice,)),
+        ):
+            for ingredient in ingredients:
+                IngredientInRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=10
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+        reset_indexes(cold=True)
+
+    def pantry(self, ingredients):
+        response = self.client.get(
+            '/api/recipes/pantry/',
+            {'ingredients': ','.join(map(str, ingredients))}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_ranking_by_coverage(self):
+        response = self.pantry([self.flour.pk, self.egg.pk])
+        self.assertEqual(response['count'], 4)
+        self.assertEqual(
+            [
+                (recipe['id'], recipe['coverage'], recipe['matched_count'])
+                for recipe in response['results']
+            ],
+            [
+                (self.toast.pk, 1.0, 1),
+                (self.bread.pk, 1.0, 1),
+                (self.pancakes.pk, 0.6667, 2),
+                (self.omelette.pk, 0.5, 1),
+            ]
+        )
+
+    def test_missing_ingredients(self):
+        results = {
+            recipe['id']: [
+                ingredient['name']
+                for ingredient in recipe['missing_ingredients']
+            ] for recipe in self.pantry([self.egg.pk])['results']
+        }
+        self.assertEqual(results, {
+            self.pancakes.pk: ['Молоко', 'Мука'],
+            self.omelette.pk: ['Молоко'],
+        })
+
+    def test_index_follows_changes(self):
+        IngredientInRecipe.objects.create(
+            recipe=self.pilaf, ingredient=self.egg, amount=1
+        )
+        recipe_ingredient_index.refresh_recipes([self.pilaf.pk])
+        self.assertIn(
+            self.pilaf.pk,
+            [recipe['id'] for recipe in self.pantry([self.egg.pk])['results']]
+        )
+
+    def test_invalid_ingredients(self):
+        for query in ('', 'ingredients=', 'ingredients=1,x'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/recipes/pantry/?{query}')
+                self.assertEqual(response.status_code, 400)
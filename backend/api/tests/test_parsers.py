@@ -0,0 +1,50 @@
+import json
+from io import BytesIO
+
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.parsers import LimitedJSONParser, RequestTooLarge
+from users.models import CustomUser
+
+LIMIT = 1024
+
+
+@override_settings(MAX_JSON_BODY_SIZE=LIMIT)
+class LimitedJSONParserTest(TestCase):
+    """Слишком большие JSON-тела отклоняются до разбора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create(
+            email='user@example.com', username='user',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        cls.token = Token.objects.create(user=user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def test_oversized_body_is_rejected(self):
+        response = self.client.post(
+            '/api/recipes/', {'name': 'x' * LIMIT, 'image': 'x'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 413)
+
+    def test_body_within_limit_is_parsed(self):
+        response = self.client.post(
+            '/api/recipes/', {'name': 'Рецепт'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.json())
+
+    def test_body_without_content_length(self):
+        parser = LimitedJSONParser()
+        with self.assertRaises(RequestTooLarge):
+            parser.parse(BytesIO(json.dumps(['x' * LIMIT]).encode()))
+        self.assertEqual(
+            parser.parse(BytesIO(b'{"name": "x"}')), {'name': 'x'}
+        )
@@ -0,0 +1,234 @@
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.tests import reset_indexes
+from recipes.counters import recompute_counters
+from recipes.models import (FavoriteRecipes, Ingredient, IngredientInRecipe,
+                            Recipe, ShoppingCart, Tag)
+from users.models import CustomUser, Subscription
+
+SNAPSHOT_DIR = Path(__file__).resolve().parent / 'snapshots'
+# UPDATE_SNAPSHOTS=1 перезаписывает эталонные ответы.
+UPDATE_SNAPSHOTS = os.getenv('UPDATE_SNAPSHOTS') == '1'
+
+PAGE_SIZES = (3, 6)
+PUB_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+IMAGE = 'recipes/images/recipe.jpg'
+
+USERS = 5
+RECIPES = 14
+TAGS = 3
+INGREDIENTS = 12
+
+
+class QueryBudgetTest(TestCase):
+    """Бюджет запросов к базе для каждого эндпоинта.
+
+    Списки проверяются на двух размерах страницы: число запросов не
+    должно от него зависеть. Кэш представлений рецептов и кэш COUNT(*)
+    перед каждым запросом очищаются, а индексы в памяти сверяют версию,
+    так что проверяется худший случай при построенных индексах. Бюджет
+    первого запроса процесса, строящего индексы, проверяется отдельно.
+    Тела ответов сравниваются с эталонами в snapshots/ побайтно.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.bulk_create(
+            Tag(id=pk, name=f'Тэг {pk}', slug=f'tag-{pk}',
+                color=f'#00000{pk}')
+            for pk in range(1, TAGS + 1)
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(id=pk, name=f'Продукт {pk:02}', measurement_unit='г')
+            for pk in range(1, INGREDIENTS + 1)
+        )
+        CustomUser.objects.bulk_create(
+            CustomUser(
+                id=pk, email=f'user{pk}@example.com', username=f'user{pk}',
+                first_name=f'Имя{pk}', last_name=f'Фамилия{pk}',
+                password=f'password{pk}'
+            ) for pk in range(1, USERS + 1)
+        )
+        Token.objects.bulk_create(
+            Token(key=f'{pk:040}', user_id=pk) for pk in range(1, USERS + 1)
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                id=pk, author_id=pk % USERS + 1, name=f'Рецепт {pk:02}',
+                text=f'Описание {pk}', cooking_time=pk * 5, image=IMAGE
+            ) for pk in range(1, RECIPES + 1)
+        )
+        recipes = list(Recipe.objects.all())
+        for recipe in recipes:
+            recipe.pub_date = PUB_DATE + timedelta(days=recipe.pk)
+        Recipe.objects.bulk_update(recipes, ['pub_date'])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe_id=pk,
+                ingredient_id=(pk + offset) % INGREDIENTS + 1,
+                amount=10 * (offset + 1)
+            )
+            for pk in range(1, RECIPES + 1) for offset in range(3)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=pk, tag_id=tag_id)
+            for pk in range(1, RECIPES + 1)
+            for tag_id in {pk % TAGS + 1, (pk + 1) % TAGS + 1}
+        )
+        FavoriteRecipes.objects.bulk_create(
+            FavoriteRecipes(user_id=1, recipe_id=pk)
+            for pk in range(1, RECIPES + 1, 2)
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user_id=1, recipe_id=pk)
+            for pk in range(1, RECIPES + 1, 3)
+        )
+        Subscription.objects.bulk_create(
+            Subscription(user_id=1, author_id=pk) for pk in range(2, USERS)
+        )
+        recompute_counters()
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {1:040}')
+
+    def assertBudget(self, queries, path, snapshot, method='get',
+                     client=None, status=200, cold=False):
+        """Проверяет код ответа, число запросов и тело ответа."""
+        reset_indexes(cold)
+        client = client or self.client
+        with self.assertNumQueries(queries):
+            response = getattr(client, method)(path)
+            content = (
+                b''.join(response.streaming_content)
+                if response.streaming else response.content
+            )
+        self.assertEqual(response.status_code, status, content)
+        if snapshot is not None:
+            self.assertSnapshot(snapshot, content)
+
+    def assertSnapshot(self, name, content):
+        path = SNAPSHOT_DIR / name
+        if UPDATE_SNAPSHOTS:
+            SNAPSHOT_DIR.mkdir(exist_ok=True)
+            path.write_bytes(content)
+        self.assertTrue(
+            path.exists(), f'Нет эталона {name}, запустите с '
+            f'UPDATE_SNAPSHOTS=1'
+        )
+        self.assertEqual(
+            content, path.read_bytes(), f'Ответ отличается от {name}'
+        )
+
+    def test_recipes_list(self):
+        for limit in PAGE_SIZES:
+            with self.subTest(limit=limit):
+                self.assertBudget(
+                    7, f'/api/recipes/?limit={limit}',
+                    f'recipes_list_{limit}.json'
+                )
+                self.assertBudget(
+                    6, f'/api/recipes/?limit={limit}&page=2',
+                    f'recipes_list_anonymous_{limit}.json',
+                    client=self.anonymous
+                )
+                self.assertBudget(
+                    7, f'/api/recipes/?limit={limit}&is_favorited=1',
+                    f'recipes_list_favorited_{limit}.json'
+                )
+
+    def test_recipes_detail(self):
+        self.assertBudget(6, '/api/recipes/1/', 'recipes_detail.json')
+        self.assertBudget(
+            8, '/api/recipes/1/', 'recipes_detail.json', cold=True
+        )
+
+    def test_favorite(self):
+        # В бюджет связей входят SAVEPOINT и RELEASE транзакции
+        # add_relation/remove_relation (в работе - BEGIN и COMMIT).
+        self.assertBudget(
+            6, '/api/recipes/2/favorite/', 'favorite_post.json',
+            method='post', status=201
+        )
+        self.assertBudget(
+            5, '/api/recipes/2/favorite/', None, method='delete', status=204
+        )
+
+    def test_shopping_cart(self):
+        self.assertBudget(
+            6, '/api/recipes/2/shopping_cart/', 'shopping_cart_post.json',
+            method='post', status=201
+        )
+        self.assertBudget(
+            5, '/api/recipes/2/shopping_cart/', None,
+            method='delete', status=204
+        )
+
+    def test_download_shopping_cart(self):
+        self.assertBudget(
+            2, '/api/recipes/download_shopping_cart/',
+            'download_shopping_cart.txt'
+        )
+
+    def test_users_list(self):
+        for limit in PAGE_SIZES:
+            with self.subTest(limit=limit):
+                self.assertBudget(
+                    3, f'/api/users/?limit={limit}',
+                    f'users_list_{limit}.json'
+                )
+
+    def test_users_me(self):
+        self.assertBudget(2, '/api/users/me/', 'users_me.json')
+
+    def test_subscriptions(self):
+        for limit in PAGE_SIZES:
+            with self.subTest(limit=limit):
+                self.assertBudget(
+                    4,
+                    f'/api/users/subscriptions/?limit={limit}'
+                    f'&recipes_limit=2',
+                    f'subscriptions_{limit}.json'
+                )
+
+    def test_subscribe(self):
+        self.assertBudget(
+            7, '/api/users/5/subscribe/', 'subscribe_post.json',
+            method='post', status=201
+        )
+        self.assertBudget(
+            5, '/api/users/5/subscribe/', None, method='delete', status=204
+        )
+
+    def test_tags(self):
+        self.assertBudget(
+            1, '/api/tags/', 'tags_list.json', client=self.anonymous
+        )
+        self.assertBudget(
+            1, '/api/tags/1/', 'tags_detail.json', client=self.anonymous
+        )
+        self.assertBudget(
+            2, '/api/tags/', 'tags_list.json', client=self.anonymous,
+            cold=True
+        )
+
+    def test_ingredients(self):
+        self.assertBudget(
+            1, '/api/ingredients/', 'ingredients_list.json',
+            client=self.anonymous
+        )
+        self.assertBudget(
+            1, '/api/ingredients/?name=Продукт 1',
+            'ingredients_search.json', client=self.anonymous
+        )
+        self.assertBudget(
+            2, '/api/ingredients/?name=Продукт 1',
+            'ingredients_search.json', client=self.anonymous, cold=True
+        )
@@ -0,0 +1,132 @@
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.constants import RELATIONS_BATCH_LIMIT
+from recipes.models import FavoriteRecipes, Recipe, ShoppingCart
+from users.models import CustomUser, Subscription
+
+MISSING_ID = 10 ** 6
+
+
+class RelationsTest(TestCase):
+    """Избранное, корзина и подписки: по одному объекту и пакетом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author, cls.other = (
+            CustomUser.objects.create(
+                email=f'{name}@example.com', username=name,
+                first_name='Имя', last_name='Фамилия',
+                password=f'password-{name}'
+            ) for name in ('user', 'author', 'other')
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=5, image='recipes/images/recipe.jpg'
+            ) for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def counter(self, recipe, field):
+        return Recipe.objects.values_list(field, flat=True).get(pk=recipe.pk)
+
+    def test_toggle_recipe_relations(self):
+        recipe = self.recipes[0]
+        for action, model, field in (
+            ('favorite', FavoriteRecipes, 'favorites_count'),
+            ('shopping_cart', ShoppingCart, 'in_carts_count'),
+        ):
+            with self.subTest(action=action):
+                url = f'/api/recipes/{recipe.pk}/{action}/'
+                response = self.client.post(url)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.json()['id'], recipe.pk)
+                self.assertEqual(self.client.post(url).status_code, 400)
+                self.assertEqual(self.counter(recipe, field), 1)
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                self.assertEqual(self.client.delete(url).status_code, 404)
+                self.assertEqual(self.counter(recipe, field), 0)
+                self.assertFalse(model.objects.exists())
+                self.assertEqual(self.client.post(
+                    f'/api/recipes/{MISSING_ID}/{action}/'
+                ).status_code, 404)
+
+    def test_toggle_subscription(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()['is_subscribed'])
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+        self.assertEqual(self.client.post(
+            f'/api/users/{self.user.pk}/subscribe/'
+        ).status_code, 400)
+        self.assertEqual(self.client.post(
+            f'/api/users/{MISSING_ID}/subscribe/'
+        ).status_code, 404)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_anonymous_user_is_rejected(self):
+        self.assertEqual(APIClient().post(
+            f'/api/recipes/{self.recipes[0].pk}/favorite/'
+        ).status_code, 401)
+
+    def test_recipe_batch(self):
+        first, second, third = (recipe.pk for recipe in self.recipes)
+        FavoriteRecipes.objects.create(user=self.user, recipe_id=first)
+        response = self.client.post(
+            '/api/recipes/favorite/',
+            {'ids': [first, second, MISSING_ID, second]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'id': first, 'status': 'exists'},
+            {'id': second, 'status': 'created'},
+            {'id': MISSING_ID, 'status': 'not_found'},
+        ])
+        self.assertEqual(self.counter(self.recipes[1], 'favorites_count'), 1)
+        response = self.client.delete(
+            '/api/recipes/favorite/', {'ids': [second, third]},
+            format='json'
+        )
+        self.assertEqual(response.json(), [
+            {'id': second, 'status': 'deleted'},
+            {'id': third, 'status': 'not_found'},
+        ])
+        self.assertEqual(self.counter(self.recipes[1], 'favorites_count'), 0)
+        self.assertEqual(
+            list(FavoriteRecipes.objects.values_list('recipe_id', flat=True)),
+            [first]
+        )
+
+    def test_subscription_batch(self):
+        response = self.client.post(
+            '/api/users/subscribe/',
+            {'ids': [self.author.pk, self.user.pk, self.other.pk]},
+            format='json'
+        )
+        self.assertEqual(response.json(), [
+            {'id': self.author.pk, 'status': 'created'},
+            {'id': self.user.pk, 'status': 'forbidden'},
+            {'id': self.other.pk, 'status': 'created'},
+        ])
+        self.assertEqual(
+            CustomUser.objects.get(pk=self.author.pk).followers_count, 1
+        )
+
+    def test_batch_validation(self):
+        for ids in ([], [0], list(range(1, RELATIONS_BATCH_LIMIT + 2))):
+            with self.subTest(size=len(ids)):
+                response = self.client.post(
+                    '/api/recipes/shopping_cart/', {'ids': ids},
+                    format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(ShoppingCart.objects.exists())
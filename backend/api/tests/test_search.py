@@ -0,0 +1,93 @@
+import sqlite3
+from datetime import datetime, timezone
+
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+from recipes.search import FTS_TABLE, update_search_index
+from users.models import CustomUser
+
+PUB_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# Предел числа параметров запроса в SQLite зависит от сборки
+# (32766 по умолчанию), в тесте он снижается до VARIABLE_LIMIT.
+VARIABLE_LIMIT = 999
+LARGE_BATCH = 2000
+
+
+class RecipeSearchTest(TestCase):
+    """Полнотекстовый поиск рецептов через параметр search."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        cls.basil = Ingredient.objects.create(
+            name='Базилик', measurement_unit='г'
+        )
+        cls.pesto, cls.soup, cls.salad, cls.pie, cls.cake = (
+            Recipe.objects.create(
+                author=author, name=name, text=text, cooking_time=5,
+                image='recipes/images/recipe.jpg'
+            ) for name, text in (
+                ('Песто', 'Соус'),
+                ('Суп', 'Тыквенный суп'),
+                ('Салат', 'Овощи'),
+                ('Тыквенный пирог', 'Выпечка'),
+                ('Тыквенный кекс', 'Выпечка'),
+            )
+        )
+        IngredientInRecipe.objects.create(
+            recipe=cls.salad, ingredient=cls.basil, amount=5
+        )
+        Recipe.objects.update(pub_date=PUB_DATE)
+        update_search_index(Recipe.objects.values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_search_by_name_text_and_ingredients(self):
+        self.assertEqual(self.search('песто'), [self.pesto.pk])
+        self.assertEqual(self.search('соус'), [self.pesto.pk])
+        self.assertEqual(self.search('базилик'), [self.salad.pk])
+
+    def test_name_matches_rank_first_and_ties_by_id(self):
+        self.assertEqual(
+            self.search('тыквенный'),
+            [self.cake.pk, self.pie.pk, self.soup.pk]
+        )
+
+    def test_reindex_after_change(self):
+        Recipe.objects.filter(pk=self.pesto.pk).update(name='Паста')
+        update_search_index([self.pesto.pk])
+        self.assertEqual(self.search('песто'), [])
+        self.assertEqual(self.search('паста'), [self.pesto.pk])
+
+    def test_batch_above_parameter_limit(self):
+        Recipe.objects.filter(pk=self.pesto.pk).delete()
+        sqlite = connection.vendor == 'sqlite'
+        if sqlite:
+            connection.ensure_connection()
+            if not hasattr(connection.connection, 'setlimit'):
+                self.skipTest('sqlite3.Connection.setlimit() is missing')
+            limit = connection.connection.setlimit(
+                sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, VARIABLE_LIMIT
+            )
+            self.addCleanup(
+                connection.connection.setlimit,
+                sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit
+            )
+        update_search_index(range(1, LARGE_BATCH + 1))
+        self.assertEqual(self.search('соус'), [])
+        if sqlite:
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+                self.assertEqual(cursor.fetchone()[0], 4)
@@ -0,0 +1,107 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests import reset_indexes
+from recipes.indexes import recipe_ingredient_index
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe,
+                            SimilarRecipe)
+from recipes.similar import rebuild_similar_recipes, update_similar_recipes
+from users.models import CustomUser
+
+
+class SimilarRecipesTest(TestCase):
+    """Таблица похожих рецептов и ее выдача."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Яйцо', 'Молоко', 'Сахар')
+        ]
+        cls.first, cls.second, cls.third, cls.fourth = (
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=5, image='recipes/images/recipe.jpg'
+            ) for number in range(4)
+        )
+        for recipe, positions in (
+            (cls.first, (0, 1, 2)),
+            (cls.second, (0, 1)),
+            (cls.third, (2, 3)),
+            (cls.fourth, (3,)),
+        ):
+            for position in positions:
+                IngredientInRecipe.objects.create(
+                    recipe=recipe, ingredient=cls.ingredients[position],
+                    amount=10
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+        reset_indexes(cold=True)
+
+    def similar(self, recipe):
+        response = self.client.get(f'/api/recipes/{recipe.pk}/similar/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            (other['id'], other['score']) for other in response.json()
+        ]
+
+    def table(self):
+        return set(SimilarRecipe.objects.values_list(
+            'recipe_id', 'similar_id', 'score'
+        ))
+
+    def test_rebuild(self):
+        self.assertEqual(rebuild_similar_recipes(), 4)
+        self.assertEqual(
+            self.similar(self.first),
+            [(self.second.pk, 0.6667), (self.third.pk, 0.25)]
+        )
+        self.assertEqual(
+            self.similar(self.third),
+            [(self.fourth.pk, 0.5), (self.first.pk, 0.25)]
+        )
+
+    def test_update_matches_rebuild(self):
+        rebuild_similar_recipes()
+        IngredientInRecipe.objects.filter(recipe=self.fourth).delete()
+        for position in (0, 1):
+            IngredientInRecipe.objects.create(
+                recipe=self.fourth, ingredient=self.ingredients[position],
+                amount=10
+            )
+        recipe_ingredient_index.refresh_recipes([self.fourth.pk])
+        update_similar_recipes([self.fourth.pk])
+        self.assertEqual(
+            self.similar(self.fourth),
+            [(self.second.pk, 1.0), (self.first.pk, 0.6667)]
+        )
+        updated = self.table()
+        rebuild_similar_recipes()
+        self.assertEqual(updated, self.table())
+
+    def test_deleted_recipe_is_dropped(self):
+        rebuild_similar_recipes()
+        deleted = self.second.pk
+        referrers = set(SimilarRecipe.objects.filter(
+            similar_id=deleted
+        ).values_list('recipe_id', flat=True))
+        Recipe.objects.filter(pk=deleted).delete()
+        recipe_ingredient_index.refresh_recipes([deleted])
+        update_similar_recipes([deleted], referrers)
+        self.assertFalse(
+            SimilarRecipe.objects.filter(similar_id=deleted).exists()
+        )
+        self.assertEqual(
+            self.similar(self.first), [(self.third.pk, 0.25)]
+        )
+
+    def test_unknown_recipe(self):
+        response = self.client.get('/api/recipes/1000000/similar/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.similar(self.first), [])
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import CustomUser, Subscription
+
+PUB_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class SubscriptionsTest(TestCase):
+    """Список подписок с ограничением recipes_limit на автора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.first, cls.second, cls.stranger = (
+            CustomUser.objects.create(
+                email=f'{name}@example.com', username=name,
+                first_name='Имя', last_name='Фамилия',
+                password=f'password-{name}'
+            ) for name in ('user', 'first', 'second', 'stranger')
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        cls.recipes = {}
+        for author, count in (
+            (cls.first, 3), (cls.second, 1), (cls.stranger, 2)
+        ):
+            cls.recipes[author.pk] = []
+            for number in range(count):
+                recipe = Recipe.objects.create(
+                    author=author, name=f'Рецепт {number}',
+                    text='Описание', cooking_time=5,
+                    image='recipes/images/recipe.jpg'
+                )
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    pub_date=PUB_DATE + timedelta(days=number)
+                )
+                cls.recipes[author.pk].append(recipe.pk)
+        for author in (cls.first, cls.second):
+            Subscription.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def subscriptions(self, params=None):
+        response = self.client.get('/api/users/subscriptions/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return {
+            author['id']: author for author in response.json()['results']
+        }
+
+    def test_only_followed_authors(self):
+        authors = self.subscriptions()
+        self.assertEqual(set(authors), {self.first.pk, self.second.pk})
+        for author in authors.values():
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(
+                [recipe['id'] for recipe in author['recipes']],
+                self.recipes[author['id']][::-1]
+            )
+
+    def test_recipes_limit_per_author(self):
+        authors = self.subscriptions({'recipes_limit': 2})
+        self.assertEqual(
+            [recipe['id'] for recipe in authors[self.first.pk]['recipes']],
+            self.recipes[self.first.pk][:0:-1]
+        )
+        self.assertEqual(authors[self.first.pk]['recipes_count'], 3)
+        self.assertEqual(
+            [recipe['id'] for recipe in authors[self.second.pk]['recipes']],
+            self.recipes[self.second.pk]
+        )
+
+    def test_invalid_recipes_limit(self):
+        for recipes_limit in ('0', '-1', 'x'):
+            with self.subTest(recipes_limit=recipes_limit):
+                response = self.client.get(
+                    '/api/users/subscriptions/',
+                    {'recipes_limit': recipes_limit}
+                )
+                self.assertEqual(response.status_code, 400)
@@ -1,59 +1,141 @@
-from django.http.response import HttpResponse
+from django.db.models import BooleanField, Exists, OuterRef, Sum, Value
+from django.http import Http404, HttpResponse
+from django.http.response import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.settings import api_settings
 
 from api.filters import IngredientSearch, RecipeFilter
+from api.metrics import registry
+from api.slow_queries import slow_query_stats
 from api.serializers import (
-    FavoriteSerializer,
     IngredientSerializer,
+    PantryRecipeSerializer,
     RecipeAddSerializer,
     RecipeListSerializer,
-    ShoppingCartSerializer,
+    RecipeSerializer,
+    RelationsBatchSerializer,
+    SimilarRecipeSerializer,
     TagSerializer
 )
-from api.pagination import CustomPagination
+from api.pagination import CustomPagination, RecipeCursorPagination
 from api.permissions import AuthorOrReadOnly, ReadOnly
+from recipes.caches import recipe_cache
+from recipes.indexes import (fuzzy_search_ingredients, ingredient_index,
+                             recipe_ingredient_index, tag_registry)
 from recipes.models import (
     IngredientInRecipe,
     FavoriteRecipes,
     Ingredient,
     Recipe,
     ShoppingCart,
+    SimilarRecipe,
     Tag)
+from recipes.relations import (add_relation, add_relations, remove_relation,
+                               remove_relations)
+from users.models import Subscription
+
+
+def relations_batch(request, model, target_field, forbidden=()):
+    """Пакетное добавление (POST) или удаление (DELETE) связей текущего
+    пользователя с объектами из списка ids. Для каждого id
+    возвращается результат: created, exists, deleted, not_found или
+    forbidden."""
+    serializer = RelationsBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = serializer.validated_data['ids']
+    allowed = [pk for pk in ids if pk not in forbidden]
+    if request.method == 'DELETE':
+        results = remove_relations(model, request.user, target_field, allowed)
+    else:
+        results = add_relations(model, request.user, target_field, allowed)
+    return Response([
+        {'id': pk, 'status': results.get(pk, 'forbidden')}
+        for pk in dict.fromkeys(ids)
+    ])
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
-    """Вьюсет получения списка тэгов/одного тэга."""
+    """Вьюсет получения списка тэгов/одного тэга.
+    Тэги отдаются из справочника в памяти; к базе обращается только
+    сверка версии справочника, не чаще INDEX_VERSION_CHECK_INTERVAL."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return Response(tag_registry.representations())
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            tag = tag_registry.representation(int(kwargs['pk']))
+        except ValueError:
+            tag = None
+        if tag is None:
+            raise Http404
+        return Response(tag)
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """Вьюсет получения списка ингредиентов/одного ингредиента.
-    Доступен фильтр по полю name."""
+    Доступен фильтр по началу поля name, список отдается из индекса
+    в памяти; к базе обращается только периодическая сверка версии
+    индекса. С параметром fuzzy=1 поиск по name нечеткий, по сходству
+    триграмм."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (IngredientSearch,)
     search_fields = ('^name',)
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name and request.query_params.get('fuzzy') in ('1', 'true'):
+            return Response(fuzzy_search_ingredients(name))
+        return Response(ingredient_index.search(name))
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет Рецептов.
     Доступен фильтр по полям (tags, author, is_favorited,
-    is_in_sopping_cart)."""
+    is_in_sopping_cart), полнотекстовый поиск search
+    и сортировка ordering=popular. Подбор рецептов по имеющимся
+    продуктам - pantry, похожие рецепты - similar."""
     queryset = Recipe.objects.all()
     serializer_class = RecipeListSerializer
     permission_classes = (AuthorOrReadOnly,)
     pagination_class = CustomPagination
+    cursor_pagination_class = RecipeCursorPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        """Рецепты вместе с автором и флагами текущего пользователя.
+        Тэги и ингредиенты догружаются одним запросом только для
+        рецептов, которых нет в кэше представлений."""
+        user = self.request.user
+        if user.is_authenticated:
+            is_favorited = Exists(FavoriteRecipes.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+            is_in_shopping_cart = Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+            is_subscribed = Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author')))
+        else:
+            is_favorited = is_in_shopping_cart = is_subscribed = Value(
+                False, output_field=BooleanField())
+        return Recipe.objects.select_related('author').annotate(
+            is_favorited=is_favorited,
+            is_in_shopping_cart=is_in_shopping_cart,
+            author_subscribed=is_subscribed
+        )
+
     def get_permissions(self):
         if self.action in ('list', 'retrieve'):
             return (ReadOnly(),)
@@ -67,34 +149,35 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def toggle_relation(self, request, pk, model, exists_message):
+        """Добавление/удаление рецепта в избранное или корзину.
+        Повторное добавление и удаление отсутствующего определяются
+        по результату INSERT ... ON CONFLICT и DELETE без
+        предварительных проверок."""
+        if request.method == 'DELETE':
+            if not remove_relation(model, user=request.user, recipe_id=pk):
+                raise Http404
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        recipe = get_object_or_404(Recipe, id=pk)
+        if not add_relation(model, user=request.user, recipe=recipe):
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    exists_message.format(recipe=recipe)
+                ]
+            })
+        serializer = RecipeSerializer(recipe, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(
         methods=['POST', 'DELETE'],
         detail=True,
         permission_classes=[IsAuthenticated]
     )
     def favorite(self, request, pk):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        if request.method == 'POST':
-            serializer = FavoriteSerializer(
-                data={
-                    'user': user.id,
-                    'recipe': recipe.id
-                },
-                context={
-                    'request': request
-                }
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            get_object_or_404(
-                FavoriteRecipes,
-                user=user,
-                recipe=recipe
-            ).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.toggle_relation(
+            request, pk, FavoriteRecipes,
+            'Рецепт {recipe} уже добавлен в избранное'
+        )
 
     @action(
         methods=['POST', 'DELETE'],
@@ -102,28 +185,103 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def shopping_cart(self, request, pk):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        if request.method == 'POST':
-            serializer = ShoppingCartSerializer(
-                data={
-                    'user': user.id,
-                    'recipe': recipe.id
-                },
-                context={
-                    'request': request
-                }
+        return self.toggle_relation(
+            request, pk, ShoppingCart,
+            'Рецепт {recipe} уже добавлен в корзину'
+        )
+
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='favorite',
+        permission_classes=[IsAuthenticated]
+    )
+    def favorite_batch(self, request):
+        return relations_batch(request, FavoriteRecipes, 'recipe')
+
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='shopping_cart',
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_batch(self, request):
+        return relations_batch(request, ShoppingCart, 'recipe')
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=[IsAdminUser]
+    )
+    def cache_stats(self, request):
+        return Response(recipe_cache.stats())
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk):
+        """Похожие по ингредиентам рецепты одним запросом к заранее
+        посчитанной таблице."""
+        recipes = []
+        for row in SimilarRecipe.objects.filter(
+            recipe_id=pk
+        ).select_related('similar').order_by('-score', '-similar_id'):
+            row.similar.score = row.score
+            recipes.append(row.similar)
+        if not recipes:
+            get_object_or_404(Recipe, id=pk)
+        serializer = SimilarRecipeSerializer(
+            recipes, many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(methods=['GET'], detail=False)
+    def pantry(self, request):
+        """Что можно приготовить: рецепты по убыванию доли ингредиентов,
+        имеющихся среди ingredients, со списком недостающих.
+        Подбор идет по индексу рецепт-ингредиент в памяти, из базы
+        читаются только рецепты и ингредиенты текущей страницы."""
+        try:
+            pantry = {
+                int(pk) for pk in request.query_params.get(
+                    'ingredients', ''
+                ).split(',') if pk.strip()
+            }
+        except ValueError:
+            pantry = set()
+        if not pantry:
+            raise ValidationError(
+                {'ingredients': 'Ожидается список id ингредиентов '
+                                'через запятую'}
             )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            get_object_or_404(
-                ShoppingCart,
-                user=user,
-                recipe=recipe
-            ).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        paginator = CustomPagination()
+        page = paginator.paginate_queryset(
+            recipe_ingredient_index.rank_by_coverage(pantry), request
+        )
+        recipes = Recipe.objects.in_bulk([row[0] for row in page])
+        missing = {
+            row[0]: recipe_ingredient_index.missing_ingredients(
+                row[0], pantry
+            ) for row in page
+        }
+        ingredients = Ingredient.objects.in_bulk(
+            set().union(*missing.values())
+        )
+        results = []
+        for recipe_id, matched_count, total in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.coverage = round(matched_count / total, 4)
+            recipe.matched_count = matched_count
+            recipe.missing_ingredients = sorted(
+                (ingredients[pk] for pk in missing[recipe_id]
+                 if pk in ingredients),
+                key=lambda ingredient: ingredient.name
+            )
+            results.append(recipe)
+        serializer = PantryRecipeSerializer(
+            results, many=True, context={'request': request}
+        )
+        return paginator.get_paginated_response(serializer.data)
 
     @action(
         methods=['GET'],
@@ -131,19 +289,50 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def download_shopping_cart(self, request):
-        ingredients = list(IngredientInRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user).values_list(
-                'ingredient__name', 'ingredient__measurement_unit', 'amount')
-        )
-        cart = {}
-        for ingredient in ingredients:
-            ing_unit = f'{ingredient[0]} ({ingredient[1]})'
-            cart[ing_unit] = cart.get(ing_unit, 0) + ingredient[2]
-        cart_data = 'Надо купить: \n'
-        for item, value in cart.items():
-            cart_data += (f'{item} - {value}\n')
+        ingredients = IngredientInRecipe.objects.filter(
+            recipe__shopping_cart__user=request.user
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(
+            total=Sum('amount')
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
         filename = 'shopping_cart.txt'
-        response = HttpResponse(cart_data, content_type='text/plain')
+        response = StreamingHttpResponse(
+            self.shopping_cart_lines(ingredients.iterator()),
+            content_type='text/plain; charset=utf-8'
+        )
         response['Content-Disposition'] = (
             f'attachment; filename="{filename}"')
         return response
+
+    @staticmethod
+    def shopping_cart_lines(ingredients):
+        """Построчно отдает список покупок по мере чтения из базы."""
+        yield 'Надо купить: \n'
+        for ingredient in ingredients:
+            yield (
+                f'{ingredient["ingredient__name"]} '
+                f'({ingredient["ingredient__measurement_unit"]}) '
+                f'- {ingredient["total"]}\n'
+            )
+
+
+class MetricsView(APIView):
+    """Гистограммы времени и числа запросов по маршрутам в текстовом
+    формате Prometheus. Значения копятся в памяти каждого процесса."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            registry.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+class SlowQueriesView(APIView):
+    """Самые тяжелые по суммарному времени запросы к базе этого
+    процесса с последним планом выполнения."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(slow_query_stats.snapshot())
@@ -31,6 +31,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.RequestProfilerMiddleware',
+    'api.middleware.RequestMetricsMiddleware',
+    'api.middleware.SlowQueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,6 +74,7 @@ if os.getenv('DATABASES', 'prod').lower() == 'prod':
             'PORT': os.getenv('DB_PORT', 5432)
         }
     }
+    INSTALLED_APPS.append('django.contrib.postgres')
 else:
     DATABASES = {
         'default': {
@@ -79,6 +83,29 @@ else:
         }
     }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Индексы в памяти процесса сверяют свою версию с таблицей IndexVersion
+# не чаще раза в INDEX_VERSION_CHECK_INTERVAL секунд: это один SELECT по
+# первичному ключу на индекс и процесс за интервал. Больший интервал
+# дешевле, но дольше показывает старые данные другим процессам.
+INDEX_VERSION_CHECK_INTERVAL = float(
+    os.getenv('INDEX_VERSION_CHECK_INTERVAL', 1)
+)
+
+# Сколько последних изменений индексов хранится в журнале IndexChange:
+# процесс, отставший сильнее, перестраивает индекс целиком.
+INDEX_CHANGE_LOG_SIZE = int(os.getenv('INDEX_CHANGE_LOG_SIZE', 1000))
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -110,6 +137,24 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/media/'
 
+RECIPE_IMAGE_WIDTHS = (320, 640, 1280)
+
+MAX_IMAGE_UPLOAD_SIZE = int(os.getenv('MAX_IMAGE_UPLOAD_SIZE', 5 * 1024 ** 2))
+
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', 40_000_000))
+
+# Тело JSON-запроса с картинкой в base64 примерно на треть больше самой
+# картинки. LimitedJSONParser отклоняет более крупные тела до разбора.
+MAX_JSON_BODY_SIZE = int(os.getenv(
+    'MAX_JSON_BODY_SIZE', MAX_IMAGE_UPLOAD_SIZE * 4 // 3 + 1024 ** 2
+))
+
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+
+DUPLICATE_LOOKUP_WORKERS = int(os.getenv('DUPLICATE_LOOKUP_WORKERS', 1))
+
+SIMILAR_UPDATE_WORKERS = int(os.getenv('SIMILAR_UPDATE_WORKERS', 1))
+
 AUTH_USER_MODEL = 'users.CustomUser'
 
 REST_FRAMEWORK = {
@@ -119,6 +164,11 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.LimitedJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
     'DEFAULT_FILTER_BACKENDS': [
@@ -126,6 +176,36 @@ REST_FRAMEWORK = {
     ],
 }
 
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 0)
+)
+
+# Метрики запросов: заголовок Server-Timing и гистограммы по маршрутам
+# на /api/metrics/ (только для администраторов).
+REQUEST_METRICS_ENABLED = (
+    os.getenv('REQUEST_METRICS_ENABLED', 'False').lower() == 'true'
+)
+
+# Журнал медленных запросов к базе: 0 - выключен. Самые тяжелые
+# запросы доступны администраторам на /api/slow_queries/.
+SLOW_QUERY_LOG_THRESHOLD_MS = float(
+    os.getenv('SLOW_QUERY_LOG_THRESHOLD_MS', 0)
+)
+SLOW_QUERY_LOG_ANALYZE = (
+    os.getenv('SLOW_QUERY_LOG_ANALYZE', 'False').lower() == 'true'
+)
+SLOW_QUERY_LOG_TOP = int(os.getenv('SLOW_QUERY_LOG_TOP', 50))
+
+# Профилирование отдельных запросов администраторов по заголовку
+# X-Profile или параметру profile (pstats или collapsed).
+REQUEST_PROFILER_ENABLED = (
+    os.getenv('REQUEST_PROFILER_ENABLED', 'False').lower() == 'true'
+)
+REQUEST_PROFILER_DIR = os.getenv('REQUEST_PROFILER_DIR', '')
+REQUEST_PROFILER_INTERVAL = float(
+    os.getenv('REQUEST_PROFILER_INTERVAL', 0.001)
+)
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
@@ -23,14 +23,17 @@ admin.site.register(IngredientInRecipe)
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'is_favorited')
+    list_display = ('name', 'author', 'is_favorited', 'duplicate_of')
+    list_select_related = ('author', 'duplicate_of')
     list_filter = ('name', 'author', 'tags')
     inlines = (IngredientInline, )
     filter_horizontal = ('tags',)
+    raw_id_fields = ('duplicate_of',)
 
     def is_favorited(self, obj):
-        return obj.fav_recipes.count()
+        return obj.favorites_count
     is_favorited.short_description = 'Добавлен в избранное'
+    is_favorited.admin_order_field = 'favorites_count'
 
 
 @admin.register(Tag)
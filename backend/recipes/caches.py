@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, QuerySet
+
+from recipes.indexes import VersionedIndex
+from recipes.models import Recipe
+
+
+class RecipeRepresentationCache(VersionedIndex):
+    """Кэш представлений рецептов, не зависящих от пользователя.
+
+    Ключ записи включает поле рецепта representation_version, которое
+    читается вместе с рецептом: invalidate_recipes() увеличивает его
+    только у измененных рецептов, и старые записи этих рецептов
+    перестают читаться во всех процессах. invalidate() сбрасывает все
+    записи сразу через общую версию из таблицы IndexVersion.
+    """
+    version_key = 'recipe_representation_version'
+
+    def __init__(self):
+        super().__init__()
+        self.hits = 0
+        self.misses = 0
+
+    def build(self):
+        return f'recipe_representation:{self.current_version()}'
+
+    def key(self, recipe, base_url):
+        return (
+            f'{self.get()}:{base_url}:{recipe.pk}:'
+            f'{recipe.representation_version}'
+        )
+
+    def get_representation(self, recipe, base_url):
+        data = cache.get(self.key(recipe, base_url))
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def set_representation(self, recipe, base_url, data):
+        cache.set(
+            self.key(recipe, base_url), data, settings.RECIPE_CACHE_TIMEOUT
+        )
+
+    @staticmethod
+    def invalidate_recipes(recipes):
+        """Сбрасывает представления рецептов: id или выборки рецептов."""
+        if not isinstance(recipes, QuerySet):
+            recipes = Recipe.objects.filter(pk__in=list(recipes))
+        recipes.update(
+            representation_version=F('representation_version') + 1
+        )
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0,
+            'version': self._version,
+        }
+
+
+recipe_cache = RecipeRepresentationCache()
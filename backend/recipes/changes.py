@@ -0,0 +1,60 @@
+import threading
+
+from django.db import transaction
+
+from recipes.duplicates import duplicate_index
+from recipes.indexes import recipe_ingredient_index
+from recipes.search import update_search_index
+from recipes.similar import schedule_similar_update
+
+
+class RecipeChanges:
+    """Рецепты, измененные в текущей транзакции.
+
+    Сигналы приходят на каждую строку IngredientInRecipe, в том числе
+    при каскадном удалении, поэтому id рецептов собираются в множества,
+    а после фиксации транзакции каждый индекс обновляется один раз.
+    """
+
+    def __init__(self):
+        self.search = set()
+        self.ingredients = set()
+        self.duplicates = set()
+        self.similar_referrers = set()
+
+    def apply(self):
+        if self is getattr(_local, 'changes', None):
+            _local.changes = None
+        if self.search:
+            update_search_index(sorted(self.search))
+        if self.ingredients:
+            recipe_ingredient_index.refresh_recipes(sorted(self.ingredients))
+            schedule_similar_update(self.ingredients, self.similar_referrers)
+        if self.duplicates:
+            duplicate_index.refresh_recipes(sorted(self.duplicates))
+
+
+_local = threading.local()
+
+
+def record_changes(recipe_ids, ingredients=False, referrers=()):
+    """Запоминает измененные рецепты. ingredients - изменился состав
+    рецептов, referrers - рецепты, ссылавшиеся на удаленные в таблице
+    похожих рецептов. Вне транзакции индексы обновляются сразу."""
+    connection = transaction.get_connection()
+    changes = getattr(_local, 'changes', None)
+    if not connection.in_atomic_block:
+        changes = RecipeChanges()
+    elif changes is None or not any(
+        # Откат транзакции или точки сохранения снимает обработчик.
+        entry[1] == changes.apply for entry in connection.run_on_commit
+    ):
+        changes = _local.changes = RecipeChanges()
+        transaction.on_commit(changes.apply)
+    changes.search.update(recipe_ids)
+    changes.duplicates.update(recipe_ids)
+    if ingredients:
+        changes.ingredients.update(recipe_ids)
+        changes.similar_referrers.update(referrers)
+    if not connection.in_atomic_block:
+        changes.apply()
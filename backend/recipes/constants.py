@@ -1,3 +1,14 @@
 NAME_MAX_LENGTH_LIMIT = 20
 MIN_QUANTITY = 1
 MAX_QUANTITY = 32000
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_SIMILARITY_THRESHOLD = 0.3
+POPULAR_ORDERING = ('-favorites_count', '-pub_date', '-id')
+SIMILAR_RECIPES_LIMIT = 10
+SIMILAR_CANDIDATES_LIMIT = 500
+SIMILAR_AFFECTED_LIMIT = 100
+DUPLICATE_PERMUTATIONS = 32
+DUPLICATE_BANDS = 8
+DUPLICATE_SIMILARITY_THRESHOLD = 0.8
+RELATIONS_BATCH_LIMIT = 100
+INDEX_CHANGE_PRUNE_EVERY = 100
@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import FavoriteRecipes, Recipe, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+# Модель связи -> (модель со счетчиком, поле связи, счетчик).
+COUNTERS = {
+    FavoriteRecipes: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'in_carts_count'),
+    Subscription: (User, 'author_id', 'followers_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+}
+
+
+def change_counter(model, pk, field, delta):
+    """Изменяет счетчик одним UPDATE с F(), не опускаясь ниже нуля."""
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """То же для нескольких объектов одним UPDATE."""
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def recompute_counters():
+    """Пересчитывает все денормализованные счетчики с нуля."""
+    Recipe.objects.update(
+        favorites_count=count_subquery(FavoriteRecipes, 'recipe'),
+        in_carts_count=count_subquery(ShoppingCart, 'recipe')
+    )
+    User.objects.update(
+        recipes_count=count_subquery(Recipe, 'author'),
+        followers_count=count_subquery(Subscription, 'author')
+    )
@@ -0,0 +1,211 @@
+import logging
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from hashlib import shake_128
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from recipes.constants import (DUPLICATE_BANDS, DUPLICATE_PERMUTATIONS,
+                               DUPLICATE_SIMILARITY_THRESHOLD)
+from recipes.indexes import VersionedIndex, recipe_ingredient_index, trigrams
+from recipes.models import IngredientInRecipe, Recipe
+
+logger = logging.getLogger(__name__)
+
+ROWS_PER_BAND = DUPLICATE_PERMUTATIONS // DUPLICATE_BANDS
+HASH_SIZE = array('Q').itemsize * DUPLICATE_PERMUTATIONS
+EMPTY_SIGNATURE = array('Q', [2 ** 64 - 1] * DUPLICATE_PERMUTATIONS)
+
+
+def recipe_tokens(name, ingredient_ids):
+    """Признаки рецепта: его ингредиенты и триграммы названия."""
+    tokens = {f'i:{pk}' for pk in ingredient_ids}
+    tokens.update(f'n:{trigram}' for trigram in trigrams(name))
+    return tokens
+
+
+@lru_cache(maxsize=65536)
+def token_hashes(token):
+    """DUPLICATE_PERMUTATIONS независимых 64-битных хэшей признака
+    из одного вызова SHAKE-128. Признаки часто повторяются в разных
+    рецептах, поэтому хэши кэшируются."""
+    return array('Q', shake_128(token.encode()).digest(HASH_SIZE))
+
+
+def signature(tokens):
+    """MinHash-сигнатура множества признаков: поэлементный минимум
+    хэшей всех признаков."""
+    if not tokens:
+        return EMPTY_SIGNATURE
+    return array('Q', map(min, zip(*map(token_hashes, tokens))))
+
+
+def band_keys(recipe_signature):
+    """Ключи корзин LSH: по одному на каждую полосу сигнатуры."""
+    return [
+        hash((band,) + tuple(recipe_signature[start:start + ROWS_PER_BAND]))
+        for band, start in enumerate(
+            range(0, DUPLICATE_PERMUTATIONS, ROWS_PER_BAND)
+        )
+    ]
+
+
+def estimate_similarity(first, second):
+    """Оценка коэффициента Жаккара по доле совпавших минимумов."""
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+def recipe_signatures(recipe_ids):
+    ingredients = {pk: set() for pk in recipe_ids}
+    for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient_id'):
+        ingredients[recipe_id].add(ingredient_id)
+    return {
+        pk: signature(recipe_tokens(name, ingredients[pk]))
+        for pk, name in Recipe.objects.filter(
+            id__in=recipe_ids
+        ).values_list('id', 'name')
+    }
+
+
+class DuplicateIndex(VersionedIndex):
+    """LSH-индекс MinHash-сигнатур рецептов для поиска почти
+    одинаковых рецептов без перебора всей базы."""
+    version_key = 'duplicate_index_version'
+    incremental = True
+
+    def build(self):
+        ingredients = recipe_ingredient_index.get()['recipes']
+        signatures = {}
+        buckets = {}
+        for pk, name in Recipe.objects.values_list('id', 'name').iterator(
+            chunk_size=10000
+        ):
+            recipe_signature = signature(
+                recipe_tokens(name, ingredients.get(pk, ()))
+            )
+            signatures[pk] = recipe_signature
+            for key in band_keys(recipe_signature):
+                buckets.setdefault(key, set()).add(pk)
+        return {'signatures': signatures, 'buckets': buckets}
+
+    def find_duplicates(self, name, ingredient_ids, exclude=None,
+                        threshold=DUPLICATE_SIMILARITY_THRESHOLD):
+        """Рецепты, похожие на данный не меньше чем на threshold:
+        список (id, сходство) от самых похожих. Сравниваются только
+        рецепты из общих корзин."""
+        data = self.get()
+        recipe_signature = signature(recipe_tokens(name, ingredient_ids))
+        candidates = set()
+        for key in band_keys(recipe_signature):
+            candidates.update(data['buckets'].get(key, ()))
+        candidates.discard(exclude)
+        result = []
+        for pk in candidates:
+            similarity = estimate_similarity(
+                recipe_signature, data['signatures'][pk]
+            )
+            if similarity >= threshold:
+                result.append((pk, similarity))
+        result.sort(key=lambda item: (-item[1], item[0]))
+        return result
+
+    def refresh_recipes(self, recipe_ids):
+        """Обновляет рецепты в индексах всех процессов."""
+        self.changed(recipe_ids)
+
+    def update(self, data, recipe_ids):
+        """Пересчитывает сигнатуры рецептов по базе и возвращает
+        обновленную копию индекса, удаленные рецепты из нее убирает.
+        Измененные корзины копируются, прежние не меняются."""
+        current = recipe_signatures(recipe_ids)
+        signatures, buckets = dict(data['signatures']), dict(data['buckets'])
+        copied = set()
+
+        def bucket(key):
+            if key not in copied:
+                copied.add(key)
+                buckets[key] = set(buckets.get(key, ()))
+            return buckets[key]
+
+        for pk in recipe_ids:
+            previous = signatures.pop(pk, None)
+            if previous is not None:
+                for key in band_keys(previous):
+                    bucket(key).discard(pk)
+                    if not buckets[key]:
+                        del buckets[key]
+                        copied.discard(key)
+            if pk in current:
+                signatures[pk] = current[pk]
+                for key in band_keys(current[pk]):
+                    bucket(key).add(pk)
+        return {'signatures': signatures, 'buckets': buckets}
+
+
+duplicate_index = DuplicateIndex()
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.DUPLICATE_LOOKUP_WORKERS,
+            thread_name_prefix='duplicate-lookup'
+        )
+    return _executor
+
+
+def mark_duplicate(recipe_id):
+    """Записывает в duplicate_of самый похожий из более ранних
+    рецептов. Индекс при необходимости строится здесь, а не в
+    запросе, создавшем рецепт."""
+    try:
+        name = Recipe.objects.filter(pk=recipe_id).values_list(
+            'name', flat=True
+        ).first()
+        if name is None:
+            return
+        ingredient_ids = IngredientInRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', flat=True)
+        originals = [
+            pk for pk, _ in duplicate_index.find_duplicates(
+                name, list(ingredient_ids), exclude=recipe_id
+            ) if pk < recipe_id
+        ]
+        if originals:
+            Recipe.objects.filter(pk=recipe_id).update(
+                duplicate_of=originals[0]
+            )
+    except Exception:
+        logger.exception('Failed to find duplicates of recipe %s', recipe_id)
+
+
+def mark_duplicate_in_worker(recipe_id):
+    """Задача пула: поток пула сам закрывает свои соединения."""
+    try:
+        mark_duplicate(recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_duplicate_lookup(recipe):
+    """Ставит поиск дубликатов рецепта в очередь пула после коммита.
+    При DUPLICATE_LOOKUP_WORKERS = 0 поиск идет сразу после коммита,
+    в текущем потоке."""
+    recipe_id = recipe.pk
+
+    def submit():
+        if settings.DUPLICATE_LOOKUP_WORKERS:
+            get_executor().submit(mark_duplicate_in_worker, recipe_id)
+        else:
+            mark_duplicate(recipe_id)
+
+    transaction.on_commit(submit)
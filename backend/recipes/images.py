@@ -0,0 +1,137 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import F
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipes/variants'
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+            thread_name_prefix='image-variants'
+        )
+    return _executor
+
+
+def render_variants(image_name):
+    """Сохраняет уменьшенные копии изображения в WebP и прогрессивном
+    JPEG и возвращает {формат: [[ширина, путь], ...]}."""
+    with default_storage.open(image_name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image = image.convert('RGB')
+    stem = PurePosixPath(image_name).stem
+    widths = [
+        width for width in settings.RECIPE_IMAGE_WIDTHS
+        if width < image.width
+    ] or [image.width]
+    variants = {name: [] for name in VARIANT_FORMATS}
+    for width in widths:
+        resized = image.copy()
+        resized.thumbnail((width, image.height))
+        for name, (image_format, options) in VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, image_format, **options)
+            path = default_storage.save(
+                f'{VARIANTS_DIR}/{stem}_{width}.{name}',
+                ContentFile(buffer.getvalue())
+            )
+            variants[name].append([width, path])
+    return variants
+
+
+def store_variants(recipe_id, image_name, variants):
+    Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_variants=variants,
+        representation_version=F('representation_version') + 1
+    )
+
+
+def build_variants(recipe_id, image_name, force=False):
+    """Строит варианты изображения рецепта и возвращает их. Готовые
+    варианты того же файла у другого рецепта используются повторно,
+    при force=True варианты строятся заново."""
+    try:
+        ready = None if force else Recipe.objects.filter(
+            image=image_name, image_variants__source=image_name
+        ).values_list('image_variants', flat=True).first()
+        variants = ready or {
+            'source': image_name, **render_variants(image_name)
+        }
+        store_variants(recipe_id, image_name, variants)
+        return variants
+    except Exception:
+        logger.exception('Failed to build variants for %s', image_name)
+
+
+def build_variants_in_worker(recipe_id, image_name):
+    """Задача пула: соединения с базой у каждого потока свои,
+    и поток пула закрывает их сам, чтобы не держать открытыми."""
+    try:
+        build_variants(recipe_id, image_name)
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(recipe):
+    """Ставит построение вариантов изображения в очередь пула потоков
+    после коммита. При IMAGE_VARIANT_WORKERS = 0 варианты строятся
+    сразу, в текущем потоке."""
+    recipe_id, image_name = recipe.pk, recipe.image.name
+
+    def submit():
+        if settings.IMAGE_VARIANT_WORKERS:
+            get_executor().submit(
+                build_variants_in_worker, recipe_id, image_name
+            )
+        else:
+            build_variants(recipe_id, image_name)
+
+    transaction.on_commit(submit)
+
+
+def variants_ready(recipe):
+    return bool(recipe.image) and (
+        recipe.image_variants.get('source') == recipe.image.name
+    )
+
+
+def image_srcset(recipe, request):
+    """srcset для каждого формата. Пока варианты не готовы, в нем
+    только оригинал."""
+    if not recipe.image:
+        return {}
+    if not variants_ready(recipe):
+        url = recipe.image.url
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        return {name: url for name in VARIANT_FORMATS}
+    srcset = {}
+    for name in VARIANT_FORMATS:
+        candidates = []
+        for width, path in recipe.image_variants[name]:
+            url = default_storage.url(path)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            candidates.append(f'{url} {width}w')
+        srcset[name] = ', '.join(candidates)
+    return srcset
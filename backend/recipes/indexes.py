@@ -0,0 +1,430 @@
+import json
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import islice
+from time import monotonic
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from recipes.constants import (INDEX_CHANGE_PRUNE_EVERY,
+                               INGREDIENT_SEARCH_LIMIT,
+                               INGREDIENT_SIMILARITY_THRESHOLD)
+from recipes.models import (Ingredient, IndexChange, IndexVersion,
+                            IngredientInRecipe, Tag)
+
+
+class VersionedIndex:
+    """Структура данных в памяти процесса, построенная по базе.
+
+    Строится при первом обращении. Номер версии хранится в общей для
+    всех процессов таблице IndexVersion, а каждый процесс не чаще раза
+    в INDEX_VERSION_CHECK_INTERVAL секунд сверяет версию (один SELECT
+    по первичному ключу).
+
+    Индексы с incremental = True обновляются на месте: changed(ids)
+    атомарно увеличивает версию и пишет id измененных записей в журнал
+    IndexChange, а процесс, отставший не больше чем на
+    INDEX_CHANGE_LOG_SIZE версий, применяет update() к записям из
+    журнала. update() строит обновленную копию рядом, и она заменяет
+    прежнюю одним присваиванием, поэтому читатели не берут блокировку.
+    invalidate() увеличивает версию без записи в журнал, и все
+    процессы перестраивают свои копии целиком.
+    """
+    version_key = None
+    incremental = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = None
+        self._data = None
+
+    def build(self):
+        raise NotImplementedError
+
+    def update(self, data, ids):
+        """Возвращает копию data с записями ids в состоянии базы.
+        Сама data не меняется: потоки, которые ее читают, делают это
+        без блокировки."""
+        raise NotImplementedError
+
+    def current_version(self):
+        return IndexVersion.objects.filter(
+            key=self.version_key
+        ).values_list('version', flat=True).first() or 0
+
+    def get(self):
+        now = monotonic()
+        if (self._data is not None and self._checked_at is not None
+                and now - self._checked_at
+                < settings.INDEX_VERSION_CHECK_INTERVAL):
+            return self._data
+        version = self.current_version()
+        if self._data is None or self._version != version:
+            with self._lock:
+                if self._data is None or self._version != version:
+                    if not self.catch_up(version):
+                        self._data = self.build()
+                    self._version = version
+        self._checked_at = now
+        return self._data
+
+    def catch_up(self, version):
+        """Применяет изменения из журнала от своей версии до version.
+        Возвращает False, если журнал неполон и нужна перестройка."""
+        if not self.incremental or self._data is None:
+            return False
+        behind = version - (self._version or 0)
+        if self._version is None or not 0 < behind <= (
+            settings.INDEX_CHANGE_LOG_SIZE
+        ):
+            return False
+        changes = list(IndexChange.objects.filter(
+            key=self.version_key,
+            version__gt=self._version,
+            version__lte=version
+        ).values_list('ids', flat=True))
+        if len(changes) != behind:
+            return False
+        self._data = self.update(self._data, set().union(*changes))
+        return True
+
+    def bump_version(self):
+        """Атомарно увеличивает версию одним INSERT ... ON CONFLICT
+        DO UPDATE ... RETURNING и возвращает новое значение."""
+        quote = connection.ops.quote_name
+        table = quote(IndexVersion._meta.db_table)
+        key, version = quote('key'), quote('version')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({key}, {version}) VALUES (%s, 1) '
+                f'ON CONFLICT ({key}) DO UPDATE '
+                f'SET {version} = {table}.{version} + 1 '
+                f'RETURNING {version}',
+                (self.version_key,)
+            )
+            return cursor.fetchone()[0]
+
+    def invalidate(self):
+        self.bump_version()
+        self._checked_at = None
+
+    def changed(self, ids):
+        """Записывает изменение записей ids в журнал. Своя копия
+        обновляется сразу, если за ней не было чужих изменений,
+        иначе догонит журнал при следующем get()."""
+        ids = sorted(set(ids))
+        with self._lock:
+            with transaction.atomic():
+                version = self.bump_version()
+                IndexChange.objects.create(
+                    key=self.version_key, version=version, ids=ids
+                )
+                if not version % INDEX_CHANGE_PRUNE_EVERY:
+                    IndexChange.objects.filter(
+                        key=self.version_key,
+                        version__lte=version - settings.INDEX_CHANGE_LOG_SIZE
+                    ).delete()
+            if self._data is not None and self._version == version - 1:
+                self._data = self.update(self._data, ids)
+                self._version = version
+            self._checked_at = None
+
+
+def normalize(value):
+    return value.strip().casefold()
+
+
+def trigrams(value):
+    """Триграммы строки по правилам pg_trgm: каждое слово дополняется
+    двумя пробелами в начале и одним в конце."""
+    result = set()
+    for word in re.findall(r'\w+', normalize(value)):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def ingredient_rows():
+    return [
+        {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+        for pk, name, measurement_unit in Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'
+        )
+    ]
+
+
+class IngredientIndex(VersionedIndex):
+    """Отсортированный по названию массив ингредиентов для поиска
+    по префиксу без обращения к базе."""
+    version_key = 'ingredient_index_version'
+
+    def build(self):
+        items = sorted(
+            ((normalize(item['name']), item) for item in ingredient_rows()),
+            key=lambda item: (item[0], item[1]['id'])
+        )
+        return [key for key, _ in items], [item for _, item in items]
+
+    def search(self, query, limit=INGREDIENT_SEARCH_LIMIT):
+        """Ингредиенты, название которых начинается с query.
+        Точное совпадение сортируется раньше более длинных названий,
+        поэтому оказывается первым. Без query отдается весь каталог."""
+        keys, items = self.get()
+        prefix = normalize(query or '')
+        if not prefix:
+            return items
+        start = bisect_left(keys, prefix)
+        result = []
+        for key, item in zip(
+            islice(keys, start, None), islice(items, start, None)
+        ):
+            if not key.startswith(prefix) or len(result) >= limit:
+                break
+            result.append(item)
+        return result
+
+
+class IngredientTrigramIndex(VersionedIndex):
+    """Инвертированный индекс триграмм названий ингредиентов для
+    нечеткого поиска там, где нет pg_trgm."""
+    version_key = IngredientIndex.version_key
+
+    def build(self):
+        items = sorted(ingredient_rows(), key=lambda item: item['name'])
+        sizes = []
+        postings = {}
+        for position, item in enumerate(items):
+            item_trigrams = trigrams(item['name'])
+            sizes.append(len(item_trigrams))
+            for trigram in item_trigrams:
+                postings.setdefault(trigram, []).append(position)
+        return items, sizes, postings
+
+    def search(self, query, limit=INGREDIENT_SEARCH_LIMIT,
+               threshold=INGREDIENT_SIMILARITY_THRESHOLD):
+        """Ингредиенты с похожестью (как similarity() в pg_trgm) не
+        ниже threshold, от самых похожих к менее похожим."""
+        items, sizes, postings = self.get()
+        query_trigrams = trigrams(query or '')
+        if not query_trigrams:
+            return []
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(postings.get(trigram, ()))
+        scored = []
+        for position, count in shared.items():
+            similarity = count / (
+                len(query_trigrams) + sizes[position] - count
+            )
+            if similarity >= threshold:
+                scored.append((-similarity, position))
+        scored.sort()
+        return [items[position] for _, position in scored[:limit]]
+
+
+class TagRegistry(VersionedIndex):
+    """Справочник тэгов в памяти процесса: экземпляры моделей
+    и готовые представления для API."""
+    version_key = 'tag_registry_version'
+
+    def build(self):
+        tags = list(Tag.objects.all())
+        return {
+            'by_id': {tag.id: tag for tag in tags},
+            'by_slug': {tag.slug: tag for tag in tags},
+            'representations': {
+                tag.id: {
+                    'id': tag.id,
+                    'name': tag.name,
+                    'color': tag.color,
+                    'slug': tag.slug
+                } for tag in tags
+            }
+        }
+
+    def get_by_id(self, pk):
+        return self.get()['by_id'].get(pk)
+
+    def slug_choices(self):
+        return [
+            (slug, tag.name) for slug, tag in self.get()['by_slug'].items()
+        ]
+
+    def representation(self, pk):
+        return self.get()['representations'].get(pk)
+
+    def representations(self):
+        return list(self.get()['representations'].values())
+
+
+class RecipeIngredientIndex(VersionedIndex):
+    """Инвертированный индекс ингредиент -> рецепты.
+
+    Списки рецептов хранятся отсортированными массивами целых чисел,
+    пересечение и разность считаются в памяти. Изменения рецептов
+    вносятся точечно через refresh_recipes().
+    """
+    version_key = 'recipe_ingredient_index_version'
+    incremental = True
+
+    def build(self):
+        postings = {}
+        recipes = {}
+        rows = IngredientInRecipe.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows.iterator(chunk_size=10000):
+            posting = postings.setdefault(ingredient_id, array('q'))
+            if not posting or posting[-1] != recipe_id:
+                posting.append(recipe_id)
+            recipes.setdefault(recipe_id, set()).add(ingredient_id)
+        return {'postings': postings, 'recipes': recipes}
+
+    @staticmethod
+    def contains(posting, recipe_id):
+        position = bisect_left(posting, recipe_id)
+        return position < len(posting) and posting[position] == recipe_id
+
+    def recipes_with_all(self, ingredient_ids):
+        postings = self.get()['postings']
+        lists = sorted(
+            (postings.get(pk, array('q')) for pk in set(ingredient_ids)),
+            key=len
+        )
+        result = list(lists[0])
+        for posting in lists[1:]:
+            if not result:
+                break
+            if len(result) * len(posting).bit_length() < len(posting):
+                # Короткий список дешевле проверить бинарным поиском.
+                result = [pk for pk in result if self.contains(posting, pk)]
+            else:
+                result = sorted(set(result).intersection(posting))
+        return result
+
+    def recipes_with_any(self, ingredient_ids):
+        postings = self.get()['postings']
+        result = set()
+        for pk in set(ingredient_ids):
+            result.update(postings.get(pk, ()))
+        return result
+
+    def rank_by_coverage(self, ingredient_ids):
+        """Рецепты, в которых есть хотя бы один из ингредиентов,
+        по убыванию доли имеющихся ингредиентов.
+
+        Возвращает список (recipe_id, совпало, всего); совпадения
+        считаются только по спискам переданных ингредиентов.
+        """
+        data = self.get()
+        postings, recipes = data['postings'], data['recipes']
+        matched = Counter()
+        for pk in set(ingredient_ids):
+            matched.update(postings.get(pk, ()))
+        ranked = [
+            (recipe_id, count, len(recipes[recipe_id]))
+            for recipe_id, count in matched.items()
+        ]
+        ranked.sort(key=lambda row: (-row[1] / row[2], -row[1], -row[0]))
+        return ranked
+
+    def missing_ingredients(self, recipe_id, ingredient_ids):
+        """Ингредиенты рецепта, которых нет среди переданных."""
+        return self.get()['recipes'].get(recipe_id, set()).difference(
+            ingredient_ids
+        )
+
+    def refresh_recipes(self, recipe_ids):
+        """Обновляет рецепты в индексах всех процессов."""
+        self.changed(recipe_ids)
+
+    def update(self, data, recipe_ids):
+        """Перечитывает ингредиенты рецептов из базы и возвращает
+        обновленную копию индекса. Словари копируются поверхностно,
+        а измененные списки - целиком. Удаленные рецепты из индекса
+        убираются."""
+        current = {pk: set() for pk in recipe_ids}
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+            recipe_id__in=ids_subquery(recipe_ids)
+        ).values_list('recipe_id', 'ingredient_id'):
+            current[recipe_id].add(ingredient_id)
+        postings, recipes = dict(data['postings']), dict(data['recipes'])
+        copied = set()
+
+        def posting(ingredient_id):
+            if ingredient_id not in copied:
+                copied.add(ingredient_id)
+                postings[ingredient_id] = array(
+                    'q', postings.get(ingredient_id, ())
+                )
+            return postings[ingredient_id]
+
+        for recipe_id, ingredient_ids in current.items():
+            previous = recipes.pop(recipe_id, set())
+            for ingredient_id in previous - ingredient_ids:
+                entries = posting(ingredient_id)
+                del entries[bisect_left(entries, recipe_id)]
+            for ingredient_id in ingredient_ids - previous:
+                insort(posting(ingredient_id), recipe_id)
+            if ingredient_ids:
+                recipes[recipe_id] = ingredient_ids
+        for ingredient_id in copied:
+            if not postings[ingredient_id]:
+                del postings[ingredient_id]
+        return {'postings': postings, 'recipes': recipes}
+
+
+def ids_subquery(ids):
+    """Подзапрос со списком id, переданным одним параметром."""
+    ids = list(ids)
+    if connection.vendor == 'postgresql':
+        return RawSQL('SELECT unnest(%s::bigint[])', (ids,))
+    if connection.vendor == 'sqlite':
+        return RawSQL('SELECT value FROM json_each(%s)', (json.dumps(ids),))
+    return ids
+
+
+def filter_by_ingredients(queryset, include=(), exclude=()):
+    """Рецепты, содержащие все ингредиенты include и ни одного
+    из exclude."""
+    if include:
+        recipe_ids = recipe_ingredient_index.recipes_with_all(include)
+        if exclude:
+            excluded = recipe_ingredient_index.recipes_with_any(exclude)
+            recipe_ids = [pk for pk in recipe_ids if pk not in excluded]
+        return queryset.filter(id__in=ids_subquery(recipe_ids))
+    if exclude:
+        return queryset.exclude(id__in=ids_subquery(
+            recipe_ingredient_index.recipes_with_any(exclude)
+        ))
+    return queryset
+
+
+ingredient_index = IngredientIndex()
+ingredient_trigram_index = IngredientTrigramIndex()
+tag_registry = TagRegistry()
+recipe_ingredient_index = RecipeIngredientIndex()
+
+
+def fuzzy_search_ingredients(query, limit=INGREDIENT_SEARCH_LIMIT):
+    """Нечеткий поиск ингредиентов: на PostgreSQL через GIN-индекс
+    pg_trgm, на остальных базах через индекс в памяти."""
+    if connection.vendor != 'postgresql':
+        return ingredient_trigram_index.search(query, limit)
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    return list(
+        Ingredient.objects.filter(
+            name__trigram_similar=query
+        ).annotate(
+            similarity=TrigramSimilarity('name', query)
+        ).order_by('-similarity', 'name').values(
+            'id', 'name', 'measurement_unit'
+        )[:limit]
+    )
@@ -0,0 +1,74 @@
+import random
+from statistics import mean, quantiles
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.indexes import (fuzzy_search_ingredients, ingredient_index,
+                             ingredient_trigram_index)
+from recipes.models import Ingredient
+
+
+def with_typo(name, rnd):
+    """Название с одной случайной опечаткой: удаление, замена или
+    перестановка соседних букв."""
+    if len(name) < 3:
+        return name
+    position = rnd.randrange(1, len(name) - 1)
+    kind = rnd.choice(('delete', 'replace', 'swap'))
+    if kind == 'delete':
+        return name[:position] + name[position + 1:]
+    if kind == 'replace':
+        return name[:position] + rnd.choice('аеиоуя') + name[position + 1:]
+    return (name[:position - 1] + name[position] + name[position - 1]
+            + name[position + 1:])
+
+
+class Command(BaseCommand):
+    help = ('Compare ingredient search modes: the ^name filter, '
+            'the in-memory prefix index and fuzzy trigram search')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def measure(self, label, search, queries, expected):
+        timings = []
+        found = 0
+        for query, name in zip(queries, expected):
+            start = perf_counter()
+            result = search(query)
+            timings.append((perf_counter() - start) * 1000)
+            found += any(item['name'] == name for item in result)
+        p95 = quantiles(timings, n=20)[-1] if len(timings) > 1 else 0
+        self.stdout.write(
+            f'{label:<22} mean {mean(timings):7.3f} ms  '
+            f'p95 {p95:7.3f} ms  found {found}/{len(queries)}'
+        )
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            self.stderr.write('Ingredient table is empty')
+            return
+        expected = [rnd.choice(names) for _ in range(options['queries'])]
+        typos = [with_typo(name, rnd) for name in expected]
+        ingredient_index.get()
+        ingredient_trigram_index.get()
+
+        def name_filter(query):
+            return list(Ingredient.objects.filter(
+                name__istartswith=query
+            ).values('id', 'name', 'measurement_unit'))
+
+        self.stdout.write(f'{len(names)} ingredients, exact names:')
+        self.measure('^name filter', name_filter, expected, expected)
+        self.measure('prefix index', ingredient_index.search,
+                     expected, expected)
+        self.measure('fuzzy', fuzzy_search_ingredients, expected, expected)
+        self.stdout.write('Names with one typo:')
+        self.measure('^name filter', name_filter, typos, expected)
+        self.measure('prefix index', ingredient_index.search,
+                     typos, expected)
+        self.measure('fuzzy', fuzzy_search_ingredients, typos, expected)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_variants, store_variants, variants_ready
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Build resized WebP and JPEG variants for recipe images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Rebuild variants that are already up to date'
+        )
+
+    def handle(self, *args, **options):
+        built = 0
+        # Рецепты идут по имени файла: общий файл перестраивается
+        # один раз, следующие рецепты получают его новые варианты.
+        last_image = last_variants = None
+        for recipe in Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_variants'
+        ).order_by('image', 'id').iterator():
+            if not options['force'] and variants_ready(recipe):
+                continue
+            image_name = recipe.image.name
+            if options['force'] and image_name == last_image:
+                if last_variants is not None:
+                    store_variants(recipe.pk, image_name, last_variants)
+            else:
+                last_image, last_variants = image_name, build_variants(
+                    recipe.pk, image_name, force=options['force']
+                )
+            built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Image variants built for {built} recipes'
+        ))
@@ -0,0 +1,23 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.similar import rebuild_similar_recipes
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the similar recipes table from recipe ingredients'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of recipes written per bulk insert'
+        )
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        count = rebuild_similar_recipes(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Similar recipes built for {count} recipes '
+            f'in {perf_counter() - start:.2f}s'
+        ))
@@ -0,0 +1,139 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from recipes.constants import DUPLICATE_SIMILARITY_THRESHOLD
+from recipes.duplicates import (band_keys, estimate_similarity,
+                                recipe_signatures)
+from recipes.indexes import ids_subquery
+from recipes.models import Recipe
+
+BANDS_TABLE = 'find_duplicate_recipes_bands'
+
+
+class Command(BaseCommand):
+    help = ('Group near-duplicate recipes in one pass over the table. '
+            'Every recipe is compared only with the first recipes of '
+            'already found groups that share an LSH bucket with it. '
+            'Bucket keys of those recipes are kept in a temporary table '
+            'and candidate signatures are recomputed per batch, so '
+            'memory is bounded by the batch size, not the table size')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of recipes read per query'
+        )
+        parser.add_argument(
+            '--threshold', type=float,
+            default=DUPLICATE_SIMILARITY_THRESHOLD,
+            help='Minimal estimated similarity of duplicates'
+        )
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Store the found groups in Recipe.duplicate_of'
+        )
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {BANDS_TABLE} '
+                f'(band_key BIGINT NOT NULL, recipe_id BIGINT NOT NULL)'
+            )
+            cursor.execute(
+                f'CREATE INDEX {BANDS_TABLE}_key ON {BANDS_TABLE} (band_key)'
+            )
+        try:
+            total, duplicates, distinct = self.find_duplicates(options)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE {BANDS_TABLE}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{duplicates} duplicates found among {total} recipes, '
+            f'{distinct} distinct recipes'
+        ))
+
+    def find_duplicates(self, options):
+        total = duplicates = distinct = 0
+        recipe_ids = Recipe.objects.order_by('id').values_list(
+            'id', flat=True
+        ).iterator(chunk_size=options['batch_size'])
+        while True:
+            batch = list(islice(recipe_ids, options['batch_size']))
+            if not batch:
+                break
+            signatures = recipe_signatures(batch)
+            keys = {pk: band_keys(signature)
+                    for pk, signature in signatures.items()}
+            # Первые рецепты групп из прежних пачек, с которыми у рецептов
+            # этой пачки есть общие корзины.
+            originals = recipe_signatures(self.stored_recipes(
+                {key for pk_keys in keys.values() for key in pk_keys}
+            ))
+            buckets = self.stored_buckets(originals)
+            found = {}
+            rows = []
+            for pk in batch:
+                signature = signatures.get(pk)
+                if signature is None:
+                    continue
+                total += 1
+                candidates = set()
+                for key in keys[pk]:
+                    candidates.update(buckets.get(key, ()))
+                best = max(
+                    (
+                        (estimate_similarity(signature, originals[other]),
+                         -other)
+                        for other in candidates
+                    ),
+                    default=(0, None)
+                )
+                if best[0] >= options['threshold']:
+                    found[pk] = -best[1]
+                    self.stdout.write(
+                        f'{pk}\t{-best[1]}\t{best[0]:.2f}'
+                    )
+                    continue
+                distinct += 1
+                originals[pk] = signature
+                for key in keys[pk]:
+                    buckets.setdefault(key, []).append(pk)
+                    rows.append((key, pk))
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT INTO {BANDS_TABLE} (band_key, recipe_id) '
+                    f'VALUES (%s, %s)', rows
+                )
+            duplicates += len(found)
+            if options['save']:
+                Recipe.objects.filter(id__in=batch).exclude(
+                    id__in=found
+                ).update(duplicate_of=None)
+                Recipe.objects.bulk_update(
+                    [Recipe(id=pk, duplicate_of_id=original)
+                     for pk, original in found.items()],
+                    ['duplicate_of']
+                )
+        return total, duplicates, distinct
+
+    @staticmethod
+    def stored_recipes(keys):
+        subquery = ids_subquery(keys)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT DISTINCT recipe_id FROM {BANDS_TABLE} '
+                f'WHERE band_key IN ({subquery.sql})', subquery.params
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def stored_buckets(originals):
+        """Корзины прежних первых рецептов групп: ключи пересчитываются
+        по их сигнатурам."""
+        buckets = {}
+        for pk in sorted(originals):
+            for key in band_keys(originals[pk]):
+                buckets.setdefault(key, []).append(pk)
+        return buckets
@@ -0,0 +1,275 @@
+import io
+import random
+from datetime import timedelta
+from hashlib import sha256
+from itertools import accumulate
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.caches import recipe_cache
+from recipes.counters import recompute_counters
+from recipes.duplicates import duplicate_index
+from recipes.indexes import (ingredient_index, ingredient_trigram_index,
+                             recipe_ingredient_index, tag_registry)
+from recipes.models import (FavoriteRecipes, Ingredient, IngredientInRecipe,
+                            Recipe, ShoppingCart, Tag)
+from recipes.search import update_search_index
+from recipes.similar import rebuild_similar_recipes
+from users.models import Subscription
+
+User = get_user_model()
+
+DISHES = (
+    'Салат', 'Суп', 'Пирог', 'Запеканка', 'Рагу', 'Каша', 'Омлет',
+    'Паста', 'Плов', 'Котлеты', 'Блины', 'Смузи', 'Соус', 'Жаркое',
+)
+SYNTHETIC_TAGS = (
+    ('Завтрак', 'breakfast'), ('Обед', 'lunch'), ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'), ('Выпечка', 'bakery'), ('Постное', 'lenten'),
+)
+SYNTHETIC_INGREDIENTS = 1000
+
+
+def power_law_weights(count, exponent):
+    """Накопленные веса закона Ципфа: i-й элемент встречается
+    примерно в 1 / i ** exponent раз реже первого."""
+    return list(accumulate(1 / (rank ** exponent)
+                           for rank in range(1, count + 1)))
+
+
+def sample_distinct(rng, population, cum_weights, count):
+    """До count различных элементов с вероятностями по весам."""
+    count = min(count, len(population))
+    result = set()
+    for _ in range(count * 4):
+        if len(result) >= count:
+            break
+        result.update(rng.choices(
+            population, cum_weights=cum_weights, k=count - len(result)
+        ))
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic dataset: users, recipes, favorites, '
+            'shopping carts and subscriptions with power-law popularity')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Average favorites per user'
+        )
+        parser.add_argument(
+            '--carts', type=float, default=5,
+            help='Average shopping cart recipes per user'
+        )
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Average subscriptions per user'
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Power-law exponent of recipe and author popularity'
+        )
+        parser.add_argument(
+            '--skip-similar', action='store_true',
+            help='Do not rebuild the similar recipes table'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('At least one user is required')
+        start = perf_counter()
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        with transaction.atomic():
+            tag_ids = self.tags()
+            ingredient_ids = self.ingredients()
+            user_ids = self.users(options['users'])
+            recipe_ids = self.recipes(
+                options['recipes'], user_ids, tag_ids, ingredient_ids,
+                options['exponent']
+            )
+            self.relations(user_ids, recipe_ids, options)
+            recompute_counters()
+            for offset in range(0, len(recipe_ids), 500):
+                update_search_index(recipe_ids[offset:offset + 500])
+            # bulk_create не отправляет сигналов, поэтому справочники
+            # тэгов и ингредиентов сбрасываются здесь же.
+            for index in (recipe_cache, recipe_ingredient_index,
+                          duplicate_index, tag_registry, ingredient_index,
+                          ingredient_trigram_index):
+                transaction.on_commit(index.invalidate)
+        if not options['skip_similar']:
+            rebuild_similar_recipes()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(user_ids)} users and {len(recipe_ids)} '
+            f'recipes in {perf_counter() - start:.2f}s'
+        ))
+
+    def bulk_create(self, model, objects, **kwargs):
+        model.objects.bulk_create(
+            objects, batch_size=self.batch_size, **kwargs
+        )
+
+    def tags(self):
+        if not Tag.objects.exists():
+            self.bulk_create(Tag, [
+                Tag(name=name, slug=slug, color=f'#{index * 0x2a2a2a:06x}')
+                for index, (name, slug) in enumerate(SYNTHETIC_TAGS, 1)
+            ])
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def ingredients(self):
+        if not Ingredient.objects.exists():
+            self.bulk_create(Ingredient, [
+                Ingredient(name=f'Продукт {index}', measurement_unit='г')
+                for index in range(1, SYNTHETIC_INGREDIENTS + 1)
+            ])
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        # Популярность ингредиентов не должна зависеть от алфавита.
+        self.rng.shuffle(ingredient_ids)
+        return ingredient_ids
+
+    def users(self, count):
+        """Пользователи с неиспользуемыми паролями: поле пароля
+        уникально, а хэширование настоящих паролей заняло бы минуты."""
+        run = f'{self.rng.getrandbits(32):08x}'
+        last_id = User.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        self.bulk_create(User, [
+            User(
+                email=f'user{index}.{run}@example.com',
+                username=f'user{index}_{run}',
+                first_name=f'Имя{index}',
+                last_name=f'Фамилия{index}',
+                password=make_password(None)
+            ) for index in range(count)
+        ])
+        return list(User.objects.filter(id__gt=last_id).order_by(
+            'id'
+        ).values_list('id', flat=True))
+
+    def image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), (222, 184, 135)).save(
+            buffer, 'JPEG', quality=80
+        )
+        content = buffer.getvalue()
+        name = f'recipes/images/{sha256(content).hexdigest()}.jpg'
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(content))
+        return name
+
+    def recipes(self, count, user_ids, tag_ids, ingredient_ids, exponent):
+        rng = self.rng
+        image = self.image()
+        ingredient_names = dict(Ingredient.objects.values_list('id', 'name'))
+        authors = user_ids[:]
+        rng.shuffle(authors)
+        author_weights = power_law_weights(len(authors), exponent)
+        ingredient_weights = power_law_weights(len(ingredient_ids), 1.0)
+        last_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        recipe_ingredients = [
+            sample_distinct(
+                rng, ingredient_ids, ingredient_weights, rng.randint(3, 12)
+            ) for _ in range(count)
+        ]
+        self.bulk_create(Recipe, [
+            Recipe(
+                author_id=author_id,
+                name=(f'{rng.choice(DISHES)} «'
+                      f'{ingredient_names[next(iter(ingredients))]}»')[:200],
+                text=' '.join(
+                    ingredient_names[pk] for pk in ingredients
+                ),
+                cooking_time=rng.randint(5, 180),
+                image=image
+            ) for author_id, ingredients in zip(
+                rng.choices(authors, cum_weights=author_weights, k=count),
+                recipe_ingredients
+            )
+        ])
+        recipes = list(Recipe.objects.filter(id__gt=last_id).order_by('id'))
+        now = timezone.now()
+        for recipe in recipes:
+            recipe.pub_date = now - timedelta(
+                minutes=rng.randint(0, 60 * 24 * 365)
+            )
+        Recipe.objects.bulk_update(
+            recipes, ['pub_date'], batch_size=self.batch_size
+        )
+        self.bulk_create(IngredientInRecipe, [
+            IngredientInRecipe(
+                recipe_id=recipe.id,
+                ingredient_id=ingredient_id,
+                amount=rng.randint(1, 500)
+            )
+            for recipe, ingredients in zip(recipes, recipe_ingredients)
+            for ingredient_id in ingredients
+        ])
+        self.bulk_create(Recipe.tags.through, [
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+            for recipe in recipes
+            for tag_id in rng.sample(
+                tag_ids, min(len(tag_ids), rng.randint(1, 3))
+            )
+        ])
+        return [recipe.id for recipe in recipes]
+
+    def relations(self, user_ids, recipe_ids, options):
+        """Избранное, корзины и подписки. Число связей у пользователя
+        распределено по Парето, выбор рецептов и авторов - по закону
+        Ципфа, так что популярные рецепты собирают большую часть."""
+        rng = self.rng
+        popular_recipes = recipe_ids[:]
+        rng.shuffle(popular_recipes)
+        recipe_weights = power_law_weights(
+            len(popular_recipes), options['exponent']
+        )
+        authors = list(Recipe.objects.filter(
+            id__in=recipe_ids
+        ).values_list('author_id', flat=True).distinct())
+        rng.shuffle(authors)
+        author_weights = power_law_weights(len(authors), options['exponent'])
+
+        def per_user(mean):
+            # Среднее распределения Парето с alpha = 2 равно 2.
+            return int(rng.paretovariate(2) * mean / 2)
+
+        for model, mean in ((FavoriteRecipes, options['favorites']),
+                            (ShoppingCart, options['carts'])):
+            if not popular_recipes:
+                break
+            self.bulk_create(model, [
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in sample_distinct(
+                    rng, popular_recipes, recipe_weights, per_user(mean)
+                )
+            ], ignore_conflicts=True)
+        if authors:
+            self.bulk_create(Subscription, [
+                Subscription(user_id=user_id, author_id=author_id)
+                for user_id in user_ids
+                for author_id in sample_distinct(
+                    rng, authors, author_weights,
+                    per_user(options['subscriptions'])
+                )
+                if author_id != user_id
+            ], ignore_conflicts=True)
@@ -1,19 +1,12 @@
-import csv
-
-from django.core.management.base import BaseCommand
-
+from recipes.indexes import ingredient_index
+from recipes.management.loaders import BulkLoadCommand
 from recipes.models import Ingredient
 
 
-class Command(BaseCommand):
-    help = 'Import ingredients.csv data into Ingredient Model'
-
-    def handle(self, *args, **kwargs):
-        with open('data/ingredients.csv', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                Ingredient.objects.get_or_create(
-                    name=row['name'],
-                    measurement_unit=row['measurement_unit']
-                )
-        print('Ingredients uploaded')
+class Command(BulkLoadCommand):
+    help = 'Import ingredients from a CSV or JSON file into Ingredient'
+    model = Ingredient
+    fields = ('name', 'measurement_unit')
+    default_file = 'ingredients.csv'
+    index = ingredient_index
+    success_message = 'Ingredients uploaded'
@@ -0,0 +1,211 @@
+import json
+import random
+import threading
+from collections import defaultdict
+from time import perf_counter
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """Процентиль по ближайшему рангу для отсортированного списка."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(rank / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Scenario:
+    """Смесь запросов к API, как в postman-коллекции проекта:
+    (вес, имя эндпоинта, нужен ли токен, функция запроса)."""
+
+    def __init__(self, rng, recipe_ids, tag_slugs, ingredient_names):
+        self.rng = rng
+        self.recipe_ids = recipe_ids
+        self.tag_slugs = tag_slugs
+        self.ingredient_names = ingredient_names
+        self.calls = (
+            (20, 'recipes-list', False, self.recipes_list),
+            (10, 'recipes-list-filtered', True, self.recipes_filtered),
+            (15, 'recipes-detail', False, self.recipes_detail),
+            (8, 'ingredients-search', False, self.ingredients),
+            (5, 'tags-list', False, lambda: ('GET', '/api/tags/')),
+            (5, 'users-list', False, lambda: ('GET', '/api/users/?page=1')),
+            (5, 'users-me', True, lambda: ('GET', '/api/users/me/')),
+            (5, 'subscriptions', True,
+             lambda: ('GET', '/api/users/subscriptions/?recipes_limit=3')),
+            (8, 'favorite', True, self.relation('favorite')),
+            (8, 'shopping-cart', True, self.relation('shopping_cart')),
+            (3, 'download-shopping-cart', True,
+             lambda: ('GET', '/api/recipes/download_shopping_cart/')),
+        )
+        self.weights = [call[0] for call in self.calls]
+
+    def next(self):
+        return self.rng.choices(self.calls, weights=self.weights)[0][1:]
+
+    def recipes_list(self):
+        return 'GET', f'/api/recipes/?page={self.rng.randint(1, 20)}'
+
+    def recipes_filtered(self):
+        slug = self.rng.choice(self.tag_slugs) if self.tag_slugs else ''
+        flag = self.rng.choice(('is_favorited', 'is_in_shopping_cart'))
+        return 'GET', f'/api/recipes/?tags={slug}&{flag}=1'
+
+    def recipes_detail(self):
+        return 'GET', f'/api/recipes/{self.rng.choice(self.recipe_ids)}/'
+
+    def ingredients(self):
+        name = self.rng.choice(self.ingredient_names)
+        return 'GET', f'/api/ingredients/?name={name[:3]}'
+
+    def relation(self, action):
+        def call():
+            method = self.rng.choice(('POST', 'DELETE'))
+            recipe_id = self.rng.choice(self.recipe_ids)
+            return method, f'/api/recipes/{recipe_id}/{action}/'
+        return call
+
+
+class Command(BaseCommand):
+    help = ('Replay a mix of API calls against a running server and '
+            'report throughput and p50/p95/p99 latency per endpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--users', type=int, default=50,
+            help='Number of users whose tokens are used for requests'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', help='Save the report as JSON to this file'
+        )
+        parser.add_argument(
+            '--compare', help='Previous JSON report to compare with'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        if not recipe_ids:
+            raise CommandError(
+                'No recipes found, run generate_dataset first'
+            )
+        tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+        ingredient_names = list(
+            Ingredient.objects.values_list('name', flat=True)[:1000]
+        )
+        tokens = [
+            Token.objects.get_or_create(user=user)[0].key
+            for user in User.objects.order_by('?')[:options['users']]
+        ]
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+        deadline = perf_counter() + options['duration']
+        workers = [
+            threading.Thread(target=self.worker, args=(
+                options['url'].rstrip('/'), deadline, tokens,
+                Scenario(
+                    random.Random(rng.random()), recipe_ids, tag_slugs,
+                    ingredient_names
+                )
+            )) for _ in range(options['concurrency'])
+        ]
+        start = perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        report = self.report(perf_counter() - start)
+        self.print_report(report, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+
+    def worker(self, base_url, deadline, tokens, scenario):
+        session = requests.Session()
+        while perf_counter() < deadline:
+            name, authenticated, call = scenario.next()
+            if authenticated and not tokens:
+                continue
+            method, path = call()
+            headers = {}
+            if authenticated:
+                headers['Authorization'] = (
+                    f'Token {scenario.rng.choice(tokens)}'
+                )
+            start = perf_counter()
+            try:
+                response = session.request(
+                    method, base_url + path, headers=headers, timeout=30
+                )
+                failed = response.status_code >= 500
+            except requests.RequestException:
+                failed = True
+            elapsed = perf_counter() - start
+            with self.lock:
+                self.samples[name].append(elapsed)
+                if failed:
+                    self.errors[name] += 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for name, samples in sorted(self.samples.items()):
+            samples.sort()
+            endpoints[name] = {
+                'requests': len(samples),
+                'errors': self.errors[name],
+                'rps': len(samples) / elapsed,
+                **{
+                    f'p{rank}_ms': percentile(samples, rank) * 1000
+                    for rank in PERCENTILES
+                },
+            }
+        total = sum(endpoint['requests'] for endpoint in endpoints.values())
+        return {
+            'duration': elapsed,
+            'requests': total,
+            'rps': total / elapsed,
+            'endpoints': endpoints,
+        }
+
+    def print_report(self, report, compare):
+        baseline = {}
+        if compare:
+            with open(compare, encoding='utf-8') as file:
+                baseline = json.load(file)['endpoints']
+        self.stdout.write(
+            f'{"endpoint":<24}{"req":>8}{"err":>6}{"rps":>9}'
+            f'{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+        )
+        for name, endpoint in report['endpoints'].items():
+            line = (
+                f'{name:<24}{endpoint["requests"]:>8}'
+                f'{endpoint["errors"]:>6}{endpoint["rps"]:>9.1f}'
+                + ''.join(
+                    f'{endpoint[f"p{rank}_ms"]:>10.1f}'
+                    for rank in PERCENTILES
+                )
+            )
+            if name in baseline:
+                before = baseline[name]['p95_ms']
+                change = (endpoint['p95_ms'] - before) / before * 100
+                line += f'  p95 {change:+.0f}%'
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(
+            f'{report["requests"]} requests in {report["duration"]:.1f}s, '
+            f'{report["rps"]:.1f} requests per second'
+        ))
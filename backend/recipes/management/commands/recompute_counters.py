@@ -0,0 +1,19 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recompute_counters
+
+
+class Command(BaseCommand):
+    help = ('Recompute favorites, shopping cart, recipes '
+            'and followers counters from scratch')
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        with transaction.atomic():
+            recompute_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Counters recomputed in {perf_counter() - start:.2f}s'
+        ))
@@ -0,0 +1,113 @@
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(path):
+    """Строки CSV-файла как словари по заголовку. Лишние запятые
+    без кавычек (например, «кефир 2,5%») относятся к первой колонке."""
+    with open(path, encoding='utf-8', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        for row in reader:
+            if not row:
+                continue
+            extra = len(row) - len(header)
+            if extra > 0:
+                row = [','.join(row[:extra + 1])] + row[extra + 1:]
+            yield dict(zip(header, row))
+
+
+def read_json(path):
+    """Объекты из JSON-массива, прочитанные по частям."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    with open(path, encoding='utf-8') as jsonfile:
+        chunk = jsonfile.read(JSON_CHUNK_SIZE)
+        buffer = chunk.lstrip()
+        if not buffer.startswith('['):
+            raise CommandError('JSON file must contain an array')
+        buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip().lstrip(',').lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                chunk = jsonfile.read(JSON_CHUNK_SIZE)
+                if not chunk:
+                    raise CommandError('Unexpected end of JSON file')
+                buffer += chunk
+                continue
+            yield item
+            buffer = buffer[end:]
+
+
+def read_rows(path):
+    suffix = Path(path).suffix.lower()
+    if suffix == '.csv':
+        return read_csv(path)
+    if suffix == '.json':
+        return read_json(path)
+    raise CommandError(f'Unsupported file format: {suffix}')
+
+
+class BulkLoadCommand(BaseCommand):
+    """Загрузка справочника из CSV или JSON пакетами bulk_create
+    в одной транзакции. Уже существующие записи пропускаются."""
+    model = None
+    fields = ()
+    default_file = None
+    index = None
+    success_message = 'Data uploaded'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=str(settings.BASE_DIR / 'data' / self.default_file)
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def get_rows(self, path):
+        for row in read_rows(path):
+            try:
+                yield {field: row[field].strip() for field in self.fields}
+            except KeyError as error:
+                raise CommandError(f'Missing column {error} in {path}')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not Path(path).is_file():
+            raise CommandError(f'File not found: {path}')
+        start = perf_counter()
+        rows = self.get_rows(path)
+        total = 0
+        with transaction.atomic():
+            before = self.model.objects.count()
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                self.model.objects.bulk_create(
+                    [self.model(**row) for row in batch],
+                    ignore_conflicts=True
+                )
+                total += len(batch)
+                self.stdout.write(f'{total} rows processed')
+            created = self.model.objects.count() - before
+            if self.index is not None:
+                transaction.on_commit(self.index.invalidate)
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.success_message}: '
+            f'{total} rows read, {created} created, '
+            f'{perf_counter() - start:.2f}s'
+        ))
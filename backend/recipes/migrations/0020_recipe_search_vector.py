@@ -0,0 +1,66 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_SQL = '''
+    CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin
+    ON recipes_recipe USING gin (search_vector);
+    UPDATE recipes_recipe AS r SET search_vector =
+        setweight(to_tsvector('russian', coalesce(r.name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(r.text, '')), 'B')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM recipes_ingredientinrecipe AS ir
+            JOIN recipes_ingredient AS i ON i.id = ir.ingredient_id
+            WHERE ir.recipe_id = r.id
+        ), '')), 'C');
+'''
+
+SQLITE_SQL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+    'USING fts5(name, text, ingredients, tokenize="unicode61")',
+    '''
+    INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients)
+    SELECT r.id, r.name, r.text, (
+        SELECT group_concat(i.name, ' ')
+        FROM recipes_ingredientinrecipe AS ir
+        JOIN recipes_ingredient AS i ON i.id = ir.ingredient_id
+        WHERE ir.recipe_id = r.id
+    )
+    FROM recipes_recipe AS r
+    ''',
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_SQL)
+    elif vendor == 'sqlite':
+        for sql in SQLITE_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
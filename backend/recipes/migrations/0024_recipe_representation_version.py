@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0023_indexversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='representation_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия представления'),
+        ),
+    ]
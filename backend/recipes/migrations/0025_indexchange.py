@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0024_recipe_representation_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, verbose_name='Ключ')),
+                ('version', models.PositiveBigIntegerField(verbose_name='Версия')),
+                ('ids', models.JSONField(verbose_name='Измененные записи')),
+            ],
+            options={
+                'verbose_name': 'Изменение индекса',
+                'verbose_name_plural': 'Изменения индексов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='indexchange',
+            constraint=models.UniqueConstraint(fields=('key', 'version'), name='unique_index_change'),
+        ),
+    ]
@@ -1,10 +1,12 @@
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
 from recipes.constants import (MAX_QUANTITY, MIN_QUANTITY,
                                NAME_MAX_LENGTH_LIMIT)
+from users.models import ProtectedFieldsMixin
 
 User = get_user_model()
 
@@ -36,9 +38,15 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            ),
+        ]
 
 
-class Recipe(models.Model):
+class Recipe(ProtectedFieldsMixin, models.Model):
     """Модель Рецептов."""
     author = models.ForeignKey(
         User, verbose_name="Автор",
@@ -50,6 +58,9 @@ class Recipe(models.Model):
         'Фото', upload_to='recipes/images',
         default=None
     )
+    image_variants = models.JSONField(
+        'Уменьшенные копии фото', default=dict, blank=True, editable=False
+    )
     text = models.TextField('Описание')
     tags = models.ManyToManyField(
         Tag,
@@ -73,6 +84,29 @@ class Recipe(models.Model):
         through='IngredientInRecipe'
     )
     pub_date = models.DateTimeField('Время побликации', auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное', default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Добавлений в корзину', default=0, editable=False
+    )
+    representation_version = models.PositiveIntegerField(
+        'Версия представления', default=0, editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+    duplicate_of = models.ForeignKey(
+        'self',
+        verbose_name='Возможный дубликат рецепта',
+        related_name='duplicates',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+
+    # Версию представления увеличивает только UPDATE с F() в сигналах.
+    protected_fields = (
+        'favorites_count', 'in_carts_count', 'representation_version'
+    )
 
     def __str__(self) -> str:
         return self.name[:NAME_MAX_LENGTH_LIMIT]
@@ -81,6 +115,12 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_popularity_idx'
+            ),
+        ]
 
 
 class IngredientInRecipe(models.Model):
@@ -164,3 +204,71 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f"{self.recipe} in {self.user}'s shopping cart"
+
+
+class SimilarRecipe(models.Model):
+    """Модель похожих рецептов: ближайшие соседи рецепта по
+    коэффициенту Жаккара на множествах ингредиентов."""
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='similar_recipes',
+        on_delete=models.CASCADE
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        verbose_name='Похожий рецепт',
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.similar} is similar to {self.recipe}'
+
+
+class IndexVersion(models.Model):
+    """Номер версии структуры данных в памяти процессов (индекса или
+    кэша). Общий для всех процессов: при расхождении со своей копией
+    процесс перестраивает ее."""
+    key = models.CharField('Ключ', max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField('Версия', default=0)
+
+    class Meta:
+        verbose_name = 'Версия индекса'
+        verbose_name_plural = 'Версии индексов'
+
+    def __str__(self):
+        return f'{self.key}: {self.version}'
+
+
+class IndexChange(models.Model):
+    """Журнал изменений индекса: версия и id записей, которые
+    изменились в ней. По нему процессы обновляют свои копии индекса
+    на месте вместо полной перестройки."""
+    key = models.CharField('Ключ', max_length=100)
+    version = models.PositiveBigIntegerField('Версия')
+    ids = models.JSONField('Измененные записи')
+
+    class Meta:
+        verbose_name = 'Изменение индекса'
+        verbose_name_plural = 'Изменения индексов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key', 'version'],
+                name='unique_index_change'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.key}: {self.version}'
@@ -0,0 +1,130 @@
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+
+from recipes.counters import COUNTERS, change_counters
+
+
+def relation_sql(model, fields):
+    opts = model._meta
+    quote = connection.ops.quote_name
+    return quote(opts.db_table), [
+        quote(opts.get_field(field).column) for field in fields
+    ]
+
+
+def add_relation(model, **values):
+    """Добавляет связь одним INSERT ... ON CONFLICT DO NOTHING по
+    уникальному ограничению на переданные поля. Возвращает False, если
+    такая связь уже была, вместо ошибки IntegrityError при гонке.
+    Вставка и обновление счетчика в обработчике сигнала идут в одной
+    транзакции."""
+    table, columns = relation_sql(model, values)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(columns)}) '
+                f'VALUES ({", ".join(["%s"] * len(columns))}) '
+                f'ON CONFLICT ({", ".join(columns)}) DO NOTHING',
+                [getattr(value, 'pk', value) for value in values.values()]
+            )
+            created = cursor.rowcount == 1
+        if created:
+            # Сигналы отправляются вручную, чтобы обработчики (счетчики)
+            # работали так же, как при сохранении через ORM.
+            post_save.send(
+                sender=model, instance=model(**values), created=True,
+                update_fields=None, raw=False, using=connection.alias
+            )
+    return created
+
+
+def remove_relation(model, **values):
+    """Удаляет связь одним DELETE и возвращает, была ли она. Удаление
+    и обновление счетчика идут в одной транзакции."""
+    table, columns = relation_sql(model, values)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE '
+                + ' AND '.join(f'{column} = %s' for column in columns),
+                [getattr(value, 'pk', value) for value in values.values()]
+            )
+            deleted = cursor.rowcount > 0
+        if deleted:
+            post_delete.send(
+                sender=model, instance=model(**values),
+                using=connection.alias
+            )
+    return deleted
+
+
+def add_relations(model, user, target_field, target_ids):
+    """Добавляет связи пользователя с объектами target_ids одним
+    INSERT ... ON CONFLICT DO NOTHING RETURNING в транзакции.
+
+    Созданными считаются только строки, которые вернул INSERT: связь,
+    вставленная параллельным запросом, не увеличит счетчик второй раз.
+    Возвращает словарь id -> created / exists / not_found.
+    """
+    target_ids = list(dict.fromkeys(target_ids))
+    target_model = model._meta.get_field(target_field).related_model
+    counter_model, _, counter = COUNTERS[model]
+    created = set()
+    with transaction.atomic():
+        targets = set(target_model.objects.filter(
+            pk__in=target_ids
+        ).values_list('pk', flat=True))
+        found = [pk for pk in target_ids if pk in targets]
+        if found:
+            table, (user_column, target_column) = relation_sql(
+                model, ('user', target_field)
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} ({user_column}, {target_column}) '
+                    f'VALUES {", ".join(["(%s, %s)"] * len(found))} '
+                    f'ON CONFLICT ({user_column}, {target_column}) '
+                    f'DO NOTHING RETURNING {target_column}',
+                    [value for pk in found for value in (user.pk, pk)]
+                )
+                created = {row[0] for row in cursor.fetchall()}
+        if created:
+            change_counters(counter_model, created, counter, 1)
+    return {
+        pk: 'created' if pk in created else
+        'exists' if pk in found else 'not_found'
+        for pk in target_ids
+    }
+
+
+def remove_relations(model, user, target_field, target_ids):
+    """Удаляет связи пользователя с объектами target_ids одним
+    DELETE ... IN в транзакции.
+
+    Возвращает словарь id -> deleted / not_found.
+    """
+    target_ids = list(dict.fromkeys(target_ids))
+    counter_model, _, counter = COUNTERS[model]
+    relations = model.objects.filter(
+        user=user, **{f'{target_field}__in': target_ids}
+    )
+    with transaction.atomic():
+        deleted = set(relations.select_for_update().values_list(
+            f'{target_field}_id', flat=True
+        ))
+        if deleted:
+            table, (user_column, target_column) = relation_sql(
+                model, ('user', target_field)
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE {user_column} = %s '
+                    f'AND {target_column} IN '
+                    f'({", ".join(["%s"] * len(deleted))})',
+                    [user.pk, *deleted]
+                )
+            change_counters(counter_model, deleted, counter, -1)
+    return {
+        pk: 'deleted' if pk in deleted else 'not_found'
+        for pk in target_ids
+    }
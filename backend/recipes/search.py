@@ -0,0 +1,90 @@
+from django.db import connection
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+
+from recipes.indexes import ids_subquery
+
+FTS_TABLE = 'recipes_recipe_fts'
+
+# Веса колонок name, text, ingredients, как A, B, C в tsvector.
+SQLITE_WEIGHTS = '10.0, 4.0, 1.0'
+
+POSTGRES_UPDATE_SQL = '''
+    UPDATE recipes_recipe AS r SET search_vector =
+        setweight(to_tsvector('russian', coalesce(r.name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(r.text, '')), 'B')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM recipes_ingredientinrecipe AS ir
+            JOIN recipes_ingredient AS i ON i.id = ir.ingredient_id
+            WHERE ir.recipe_id = r.id
+        ), '')), 'C')
+    WHERE r.id = ANY(%s)
+'''
+
+SQLITE_DELETE_SQL = f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({{}})'
+
+SQLITE_INSERT_SQL = f'''
+    INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients)
+    SELECT r.id, r.name, r.text, (
+        SELECT group_concat(i.name, ' ')
+        FROM recipes_ingredientinrecipe AS ir
+        JOIN recipes_ingredient AS i ON i.id = ir.ingredient_id
+        WHERE ir.recipe_id = r.id
+    )
+    FROM recipes_recipe AS r
+    WHERE r.id IN ({{}})
+'''
+
+
+def update_search_index(recipe_ids):
+    """Пересчитывает поисковый индекс рецептов: tsvector на PostgreSQL,
+    строки таблицы FTS5 на SQLite. Удаленные рецепты из FTS5
+    удаляются."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(POSTGRES_UPDATE_SQL, [recipe_ids])
+        elif connection.vendor == 'sqlite':
+            # Список id передается одним параметром: число параметров
+            # запроса в SQLite ограничено.
+            ids = ids_subquery(recipe_ids)
+            cursor.execute(SQLITE_DELETE_SQL.format(ids.sql), ids.params)
+            cursor.execute(SQLITE_INSERT_SQL.format(ids.sql), ids.params)
+
+
+def fts5_query(query):
+    """Запрос FTS5 из пользовательской строки: каждое слово в кавычках
+    как префикс, чтобы спецсимволы не ломали синтаксис."""
+    words = [word.replace('"', '""') for word in query.split()]
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, query):
+    """Фильтрует queryset по полнотекстовому запросу и сортирует по
+    релевантности. Остальные фильтры queryset сохраняются."""
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(
+            query, config='russian', search_type='websearch'
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-pub_date', '-id')
+    if connection.vendor == 'sqlite':
+        match = fts5_query(query)
+        if not match:
+            return queryset
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,)
+        )).annotate(rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {SQLITE_WEIGHTS}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND rowid = recipes_recipe.id',
+            (match,)
+        )).order_by('rank', '-pub_date', '-id')
+    return queryset.filter(name__icontains=query)
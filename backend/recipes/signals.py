@@ -0,0 +1,151 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from recipes.caches import recipe_cache
+from recipes.changes import record_changes
+from recipes.counters import COUNTERS, change_counter
+from recipes.images import schedule_variants, variants_ready
+from recipes.indexes import ingredient_index, tag_registry
+from recipes.models import (FavoriteRecipes, Ingredient, IngredientInRecipe,
+                            Recipe, ShoppingCart, SimilarRecipe, Tag)
+from recipes.search import update_search_index
+from users.models import Subscription
+
+User = get_user_model()
+
+AUTHOR_REPRESENTATION_FIELDS = {
+    'email', 'username', 'first_name', 'last_name'
+}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_recipes(instance, created, **kwargs):
+    # При удалении ингредиента представления сбрасывает каскадное
+    # удаление строк IngredientInRecipe.
+    if not created:
+        recipe_cache.invalidate_recipes(
+            Recipe.objects.filter(ingredients=instance)
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(instance, created, **kwargs):
+    if not created:
+        recipe_ids = list(instance.ingredient.values_list(
+            'recipe_id', flat=True
+        ))
+        transaction.on_commit(lambda: update_search_index(recipe_ids))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def reindex_recipe(instance, **kwargs):
+    record_changes([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def reindex_recipe_ingredients(instance, **kwargs):
+    record_changes([instance.recipe_id], ingredients=True)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_similar_referrers(instance, **kwargs):
+    instance.similar_referrers = list(SimilarRecipe.objects.filter(
+        similar=instance
+    ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_ingredient_index(instance, **kwargs):
+    record_changes(
+        [instance.pk], ingredients=True,
+        referrers=getattr(instance, 'similar_referrers', ())
+    )
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_registry(**kwargs):
+    transaction.on_commit(tag_registry.invalidate)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def invalidate_tag_recipes(instance, created=False, **kwargs):
+    if not created:
+        recipe_cache.invalidate_recipes(
+            Recipe.objects.filter(tags=instance)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe_representation(instance, created, **kwargs):
+    if not created:
+        recipe_cache.invalidate_recipes([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    recipe_cache.invalidate_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recipe_cache.invalidate_recipes([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        recipe_cache.invalidate_recipes(pk_set)
+    elif action == 'pre_clear':
+        recipe_cache.invalidate_recipes(
+            Recipe.objects.filter(tags=instance)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def build_image_variants(instance, **kwargs):
+    if instance.image and not variants_ready(instance):
+        schedule_variants(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, created, update_fields=None,
+                              **kwargs):
+    """Сбрасывает представления рецептов автора, только если
+    изменились поля автора в представлении. У новых пользователей
+    рецептов нет, для них запрос не выполняется. Счетчик recipes_count
+    в памяти может быть устаревшим, поэтому рецепты выбираются в базе."""
+    if created:
+        return
+    if update_fields and not AUTHOR_REPRESENTATION_FIELDS.intersection(
+        update_fields
+    ):
+        return
+    recipe_cache.invalidate_recipes(
+        Recipe.objects.filter(author=instance)
+    )
+
+
+@receiver(post_save, sender=FavoriteRecipes)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Recipe)
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        model, field, counter = COUNTERS[sender]
+        change_counter(model, getattr(instance, field), counter, 1)
+
+
+@receiver(post_delete, sender=FavoriteRecipes)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Recipe)
+def decrement_counter(sender, instance, **kwargs):
+    model, field, counter = COUNTERS[sender]
+    change_counter(model, getattr(instance, field), counter, -1)
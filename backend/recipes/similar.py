@@ -0,0 +1,180 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from heapq import nsmallest
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Min
+
+from recipes.constants import (SIMILAR_AFFECTED_LIMIT,
+                               SIMILAR_CANDIDATES_LIMIT,
+                               SIMILAR_RECIPES_LIMIT)
+from recipes.indexes import ids_subquery, recipe_ingredient_index
+from recipes.models import SimilarRecipe
+
+logger = logging.getLogger(__name__)
+
+
+def candidate_recipes(recipe_id, data, limit=SIMILAR_CANDIDATES_LIMIT):
+    """Не больше limit рецептов с общими ингредиентами. Списки
+    перебираются от редких ингредиентов к частым: общий редкий
+    ингредиент говорит о сходстве больше, чем соль или сахар, а
+    длинные списки частых ингредиентов не просматриваются целиком."""
+    postings = data['postings']
+    candidates = set()
+    for ingredient_id in sorted(
+        data['recipes'][recipe_id],
+        key=lambda pk: len(postings.get(pk, ()))
+    ):
+        posting = postings.get(ingredient_id, ())
+        # Из длинного списка берутся самые новые рецепты.
+        candidates.update(posting[-(limit - len(candidates) + 1):])
+        candidates.discard(recipe_id)
+        if len(candidates) >= limit:
+            break
+    return candidates
+
+
+def jaccard_scores(recipe_id, data):
+    """Коэффициент Жаккара рецепта с кандидатами из
+    candidate_recipes(). Работа ограничена числом кандидатов и не
+    зависит от длины списков в инвертированном индексе."""
+    recipes = data['recipes']
+    ingredient_ids = recipes.get(recipe_id)
+    if not ingredient_ids:
+        return {}
+    scores = {}
+    for other_id in candidate_recipes(recipe_id, data):
+        other = recipes[other_id]
+        shared = len(ingredient_ids & other)
+        scores[other_id] = round(
+            shared / (len(ingredient_ids) + len(other) - shared), 4
+        )
+    return scores
+
+
+def nearest_recipes(recipe_id, data, limit=SIMILAR_RECIPES_LIMIT):
+    """До limit самых похожих рецептов: список (id, сходство)."""
+    return nsmallest(
+        limit,
+        jaccard_scores(recipe_id, data).items(),
+        key=lambda item: (-item[1], -item[0])
+    )
+
+
+def similar_rows(recipe_ids, data):
+    return [
+        SimilarRecipe(recipe_id=recipe_id, similar_id=other_id, score=score)
+        for recipe_id in recipe_ids
+        for other_id, score in nearest_recipes(recipe_id, data)
+    ]
+
+
+def rebuild_similar_recipes(batch_size=1000):
+    """Пересчитывает таблицу похожих рецептов целиком. Строки пишутся
+    пачками по batch_size рецептов в одной транзакции, так что
+    читатели до ее завершения видят прежние списки."""
+    data = recipe_ingredient_index.get()
+    recipe_ids = sorted(data['recipes'])
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        for start in range(0, len(recipe_ids), batch_size):
+            SimilarRecipe.objects.bulk_create(similar_rows(
+                recipe_ids[start:start + batch_size], data
+            ))
+    return len(recipe_ids)
+
+
+def update_similar_recipes(recipe_ids, affected_ids=()):
+    """Обновляет таблицу после изменения ингредиентов рецептов.
+
+    Кроме самих рецептов пересчитываются только те, в чьих списках
+    они были или куда теперь попадают: сходство симметрично, поэтому
+    кандидаты берутся из сходства измененного рецепта. affected_ids -
+    рецепты, которые нужно пересчитать дополнительно (например,
+    ссылавшиеся на удаленный рецепт). Пересчитывается не больше
+    SIMILAR_AFFECTED_LIMIT чужих списков: сначала ссылавшиеся на
+    рецепты, затем самые похожие кандидаты. Остальные списки догонит
+    build_similar_recipes.
+    """
+    data = recipe_ingredient_index.get()
+    recipe_ids = set(recipe_ids)
+    referrers = set(affected_ids) | set(
+        SimilarRecipe.objects.filter(
+            similar_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True)
+    )
+    scores = {}
+    for recipe_id in recipe_ids:
+        for other_id, score in jaccard_scores(recipe_id, data).items():
+            scores[other_id] = max(score, scores.get(other_id, 0))
+    lists = {
+        recipe_id: (lowest, size)
+        for recipe_id, lowest, size in SimilarRecipe.objects.filter(
+            recipe_id__in=ids_subquery(
+                scores.keys() - referrers - recipe_ids
+            )
+        ).values('recipe_id').annotate(
+            lowest=Min('score'), size=Count('id')
+        ).values_list('recipe_id', 'lowest', 'size')
+    }
+    candidates = sorted(
+        (
+            other_id for other_id, score in scores.items()
+            if other_id not in referrers and (
+                lists.get(other_id, (0, 0))[1] < SIMILAR_RECIPES_LIMIT
+                or score > lists[other_id][0]
+            )
+        ),
+        key=lambda other_id: (-scores[other_id], -other_id)
+    )
+    affected = set(
+        (sorted(referrers - recipe_ids) + candidates)[
+            :SIMILAR_AFFECTED_LIMIT
+        ]
+    ) | recipe_ids
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(
+            recipe_id__in=ids_subquery(affected)
+        ).delete()
+        SimilarRecipe.objects.bulk_create(similar_rows(
+            affected & data['recipes'].keys(), data
+        ))
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.SIMILAR_UPDATE_WORKERS,
+            thread_name_prefix='similar-recipes'
+        )
+    return _executor
+
+
+def update_similar_recipes_in_worker(recipe_ids, affected_ids):
+    """Задача пула: поток пула сам закрывает свои соединения."""
+    try:
+        update_similar_recipes(recipe_ids, affected_ids)
+    except Exception:
+        logger.exception(
+            'Failed to update similar recipes of %s', sorted(recipe_ids)
+        )
+    finally:
+        connections.close_all()
+
+
+def schedule_similar_update(recipe_ids, affected_ids=()):
+    """Ставит пересчет похожих рецептов в очередь пула. Вызывается
+    после коммита. При SIMILAR_UPDATE_WORKERS = 0 пересчет идет сразу,
+    в текущем потоке."""
+    recipe_ids, affected_ids = set(recipe_ids), set(affected_ids)
+    if settings.SIMILAR_UPDATE_WORKERS:
+        get_executor().submit(
+            update_similar_recipes_in_worker, recipe_ids, affected_ids
+        )
+    else:
+        update_similar_recipes(recipe_ids, affected_ids)
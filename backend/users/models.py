@@ -3,7 +3,27 @@ from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
 
 
-class CustomUser(AbstractUser):
+class ProtectedFieldsMixin:
+    '''Поля protected_fields меняются только через UPDATE с F().
+    Полное сохранение объекта их не пишет, иначе устаревший объект
+    затирает значения, измененные после его загрузки.'''
+    protected_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.protected_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class CustomUser(ProtectedFieldsMixin, AbstractUser):
     '''Кастомная модель юзера.'''
     email = models.EmailField('Email', unique=True)
     username = models.CharField(
@@ -15,6 +35,14 @@ class CustomUser(AbstractUser):
     last_name = models.CharField('Фамилия', max_length=150)
     password = models.CharField('Пароль', max_length=150, unique=True)
     is_subscribed = models.BooleanField('Подписка', default=False)
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False
+    )
+
+    protected_fields = ('recipes_count', 'followers_count')
 
     REQUIRED_FIELDS = ('first_name', 'last_name', 'username')
     USERNAME_FIELD = 'email'
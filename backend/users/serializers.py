@@ -1,5 +1,5 @@
 from djoser.serializers import UserSerializer
-from rest_framework import serializers, validators
+from rest_framework import serializers
 
 from api import serializers as apiserializers
 from users.models import CustomUser, Subscription
@@ -17,6 +17,8 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -46,16 +48,24 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         request = self.context.get('request')
         return (Subscription.objects.filter(
             user=request.user, author=obj).exists()
             and request.user.is_authenticated)
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
     def get_recipes(self, obj):
         request = self.context.get('request')
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            return apiserializers.RecipeSerializer(
+                recipes_by_author[obj.id], many=True,
+                context={'request': request}
+            ).data
         recipes = obj.recipes.all()
         recipes_limit = request.query_params.get('recipes_limit', False)
         if recipes_limit:
@@ -63,31 +73,3 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return apiserializers.RecipeSerializer(
             recipes, many=True, context={'request': request}
         ).data
-
-
-class SubscriptionCreateSerializer(serializers.ModelSerializer):
-    '''Сериализатор для создания подписки.'''
-    class Meta:
-        model = Subscription
-        fields = ('user', 'author')
-        validators = [
-            validators.UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=['user', 'author'],
-                message='Вы уже подписаны на этого автора'
-            )
-        ]
-
-    def validate(self, attrs):
-        if attrs.get('user') == attrs.get('author'):
-            raise serializers.ValidationError(
-                'Нельзя подписаться на самого себя'
-            )
-        return attrs
-
-    def to_representation(self, instance):
-        request = self.context.get('request')
-        return SubscriptionSerializer(
-            instance.author,
-            context={'request': request}
-        ).data
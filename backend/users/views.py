@@ -1,17 +1,24 @@
+from django.db.models import (BooleanField, Exists, F, OuterRef, Value,
+                              Window)
+from django.db.models.functions import RowNumber
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly
                                         )
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from api.pagination import CustomPagination
+from api.pagination import CustomPagination, UserCursorPagination
+from api.views import relations_batch
+from recipes.models import Recipe
+from recipes.relations import add_relation, remove_relation
 from users.models import CustomUser, Subscription
-from users.serializers import (CustomUserSerializer,
-                               SubscriptionCreateSerializer,
-                               SubscriptionSerializer)
+from users.serializers import CustomUserSerializer, SubscriptionSerializer
 
 
 class CustomUserViewSet(UserViewSet):
@@ -20,6 +27,18 @@ class CustomUserViewSet(UserViewSet):
     serializer_class = CustomUserSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = CustomPagination
+    cursor_pagination_class = UserCursorPagination
+
+    def get_queryset(self):
+        """Пользователи с флагом подписки текущего пользователя,
+        вычисленным в том же запросе."""
+        user = self.request.user
+        if user.is_authenticated:
+            subscribed = Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('pk')))
+        else:
+            subscribed = Value(False, output_field=BooleanField())
+        return super().get_queryset().annotate(subscribed=subscribed)
 
     @action(detail=False,
             methods=['GET'],
@@ -28,30 +47,96 @@ class CustomUserViewSet(UserViewSet):
     def subscriptions(self, request):
         subscriptions = CustomUser.objects.filter(
             following__user=request.user
-        )
+        ).annotate(subscribed=Value(True, output_field=BooleanField()))
         pages = self.paginate_queryset(subscriptions)
         serializer = SubscriptionSerializer(
-            pages, many=True, context={'request': request}
+            pages, many=True, context={
+                'request': request,
+                'recipes_by_author': self.get_recipes_by_author(
+                    [author.id for author in pages],
+                    self.get_recipes_limit(request)
+                )
+            }
         )
         return self.get_paginated_response(serializer.data)
 
+    @staticmethod
+    def get_recipes_limit(request):
+        recipes_limit = request.query_params.get('recipes_limit')
+        if not recipes_limit:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            recipes_limit = 0
+        if recipes_limit < 1:
+            raise ValidationError(
+                {'recipes_limit': 'Ожидается целое положительное число'}
+            )
+        return recipes_limit
+
+    @staticmethod
+    def get_recipes_by_author(author_ids, recipes_limit=None):
+        """Рецепты авторов страницы одним запросом. Ограничение
+        recipes_limit на автора применяется в базе через ROW_NUMBER()
+        с разбиением по автору."""
+        recipes = Recipe.objects.filter(author__in=author_ids)
+        if recipes_limit is not None:
+            ranked = recipes.annotate(
+                row_number=Window(
+                    expression=RowNumber(),
+                    partition_by=F('author'),
+                    order_by=(F('pub_date').desc(), F('id').desc())
+                )
+            ).order_by()
+            sql, params = ranked.query.sql_with_params()
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) AS ranked '
+                f'WHERE ranked.row_number <= %s '
+                f'ORDER BY ranked.row_number',
+                (*params, recipes_limit)
+            )
+        recipes_by_author = {author_id: [] for author_id in author_ids}
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        return recipes_by_author
+
     @action(detail=True,
             methods=['POST', 'DELETE'],
             url_path='subscribe',
             permission_classes=[IsAuthenticated])
     def subscribe(self, request, id):
+        """Подписка/отписка одним INSERT ... ON CONFLICT или DELETE
+        без предварительных проверок существования подписки."""
         user = request.user
-        author = get_object_or_404(CustomUser, pk=id)
-        if request.method == 'POST':
-            serializer = SubscriptionCreateSerializer(
-                data={'user': user.id,
-                      'author': author.id},
-                context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            get_object_or_404(
-                Subscription, user=user, author=author).delete()
+            if not remove_relation(Subscription, user=user, author_id=id):
+                raise Http404
             return Response(status=status.HTTP_204_NO_CONTENT)
+        author = get_object_or_404(CustomUser, pk=id)
+        if author == user:
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Нельзя подписаться на самого себя'
+                ]
+            })
+        if not add_relation(Subscription, user=user, author=author):
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Вы уже подписаны на этого автора'
+                ]
+            })
+        author.subscribed = True
+        serializer = SubscriptionSerializer(
+            author, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False,
+            methods=['POST', 'DELETE'],
+            url_path='subscribe',
+            permission_classes=[IsAuthenticated])
+    def subscribe_batch(self, request):
+        return relations_batch(
+            request, Subscription, 'author', forbidden={request.user.pk}
+        )